@@ -0,0 +1,361 @@
+"""
+Drives every endpoint of the books and users APIs and reports latency
+percentiles, queries per request and throughput, then compares them with a
+stored baseline.
+
+In-process, against a throwaway test database seeded on the fly:
+
+    python -m benchmarks.api --books 20000 --users 2000
+
+Against a local server on a scratch database seeded with benchmarks.fixtures
+(the server is started and stopped by the runner):
+
+    python -m benchmarks.api --database-url postgres://.../bookhive_bench --server uvicorn --concurrency 32
+
+Pass --save-baseline to store the results, later runs are compared with
+it and exit with an error when p95 latency or the query count regresses.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+from benchmarks import setup_django, summarize, test_database
+
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# buckets large enough that the login scenario measures password
+# verification rather than the throttle's 429s
+UNTHROTTLED = {
+    "LOGIN_THROTTLE_IP_BURST": "1000000000",
+    "LOGIN_THROTTLE_EMAIL_BURST": "1000000000",
+}
+
+
+class Scenario:
+    """
+    One endpoint call. `path` and `body` may be callables taking the run
+    context, so every iteration can target a different record. A response
+    whose status isn't in `expect` counts as an error.
+    """
+
+    def __init__(self, name, method, path, body=None, auth=True, content_type="application/json",
+                 expect=range(200, 300)):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.auth = auth
+        self.content_type = content_type
+        self.expect = expect
+
+    def build(self, context):
+        path = self.path(context) if callable(self.path) else self.path
+        body = self.body(context) if callable(self.body) else self.body
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        headers = {"Authorization": f"Bearer {context.access_token}"} if self.auth else {}
+        return self.method, path, body, headers
+
+
+class RunContext:
+    """Records shared by the scenarios, prepared directly in the database"""
+
+    def __init__(self, iterations):
+        from django.contrib.auth import get_user_model
+        from bookhiveConfig.utils import generate_user_token
+        from books.models import Book
+        from benchmarks.fixtures import BENCH_PASSWORD
+
+        User = get_user_model()
+        self.password = BENCH_PASSWORD
+        self.admin = User.objects.create_user(
+            email=f"bench_admin_{time.time_ns()}@bookhive.io", password=BENCH_PASSWORD, user_type="admin"
+        )
+        self.access_token = generate_user_token(self.admin)["access"]
+        self.book_id = Book.objects.order_by("-id").values_list("id", flat=True).first() or self._book().id
+        self.user_id = self.admin.id
+        self.max_book_id = self.book_id
+        self.unique = itertools.count()
+        self.refresh_tokens = iter([generate_user_token(self.admin)["refresh"] for _ in range(iterations)])
+        # throwaway records for the destructive scenarios
+        self.deletable_books = iter(self._book().id for _ in range(iterations))
+        self.deletable_users = iter(
+            User.objects.create(email=f"bench_delete_{time.time_ns()}_{i}@bookhive.io",
+                                username=f"bench_delete_{time.time_ns()}_{i}").id
+            for i in range(iterations)
+        )
+
+    def _book(self):
+        from books.models import Book
+        return Book.objects.create(
+            title="Benchmark Book", author="Bench Author", publication_date="2024-01-01",
+            isbn="9780000000000", tag="admin"
+        )
+
+
+def ndjson_books(count):
+    return "\n".join(
+        json.dumps({"title": f"Bulk {i}", "author": "Bench", "publication_date": "2024-01-01", "isbn": str(i)})
+        for i in range(count)
+    )
+
+
+def scenarios():
+    books, users = "/api/book_mgt", "/api/user_mgt"
+    book_body = {"title": "Bench", "author": "Bench", "publication_date": "2024-01-01", "isbn": "1", "tag": "admin"}
+    return [
+        Scenario("books: list", "GET", f"{books}/books", auth=False),
+        Scenario("books: list deep page", "GET", f"{books}/books?page=500&size=10", auth=False),
+        Scenario("books: list no total", "GET", f"{books}/books?include_total=false", auth=False),
+        Scenario("books: list cursor", "GET", lambda c: f"{books}/books?pagination=cursor&after=" + cursor(c.max_book_id // 2), auth=False),
+        Scenario("books: list by tag", "GET", f"{books}/books?tag=custom", auth=False),
+        Scenario("books: list title prefix", "GET", f"{books}/books?title=shadow", auth=False),
+        Scenario("books: search", "GET", f"{books}/books?q=shadow%20river", auth=False),
+        Scenario("books: get", "GET", lambda c: f"{books}/books/{c.book_id}"),
+        Scenario("books: create", "POST", f"{books}/books", body=book_body),
+        Scenario("books: bulk import 100", "POST", f"{books}/books/bulk", body=ndjson_books(100),
+                 content_type="application/x-ndjson"),
+        Scenario("books: export since", "GET", f"{books}/books/export?updated_since=2999-01-01T00:00:00Z"),
+        Scenario("books: patch", "PATCH", lambda c: f"{books}/books/{c.book_id}", body={"title": "Patched"}),
+        Scenario("books: put", "PUT", lambda c: f"{books}/books/{c.book_id}", body=book_body),
+        Scenario("books: delete", "DELETE", lambda c: f"{books}/books/{next(c.deletable_books)}"),
+        Scenario("users: signup", "POST", f"{users}/signup", auth=False, body=lambda c: {
+            "email": f"bench_signup_{time.time_ns()}_{next(c.unique)}@bookhive.io",
+            "first_name": "Bench", "last_name": "Signup", "password": c.password,
+        }),
+        # one account from one client, it needs the login throttles off
+        Scenario("users: login", "POST", f"{users}/login", auth=False, expect=(200,),
+                 body=lambda c: {"email": c.admin.email, "password": c.password}),
+        Scenario("users: token refresh", "POST", f"{users}/token/refresh", auth=False,
+                 body=lambda c: {"refresh_token": next(c.refresh_tokens)}),
+        Scenario("users: list", "GET", f"{users}/users"),
+        Scenario("users: list by last name", "GET", f"{users}/users?last_name=aus"),
+        Scenario("users: get", "GET", lambda c: f"{users}/users/{c.user_id}"),
+        Scenario("users: patch", "PATCH", lambda c: f"{users}/users/{c.user_id}", body={"first_name": "Bench"}),
+        Scenario("users: put", "PUT", lambda c: f"{users}/users/{c.user_id}", body=lambda c: {
+            "email": c.admin.email, "first_name": "Bench", "last_name": "Admin", "user_type": "admin",
+        }),
+        Scenario("users: delete", "DELETE", lambda c: f"{users}/users/{next(c.deletable_users)}"),
+    ]
+
+
+def cursor(value):
+    from bookhiveConfig.pagination import encode_cursor
+    return encode_cursor(value)
+
+
+class InProcessDriver:
+    """Calls the API through Django's test client and counts the SQL queries"""
+
+    counts_queries = True
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+
+    def request(self, method, path, body, headers, content_type):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.generic(method, path, data=body or "", content_type=content_type, headers=headers)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        return response.status_code, elapsed, len(queries)
+
+
+class HttpDriver:
+    """Calls a running server over keep-alive HTTP connections, one per thread"""
+
+    counts_queries = False
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def request(self, method, path, body, headers, content_type):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {**headers, "Content-Type": content_type}
+        start = time.perf_counter()
+        try:
+            self.local.connection.request(method, path, body=body, headers=headers)
+            response = self.local.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.local.connection.close()
+            del self.local.connection
+            raise
+        return response.status, (time.perf_counter() - start) * 1000, None
+
+
+def run_scenario(driver, scenario, context, repeat, warmup, concurrency):
+    for _ in range(warmup):
+        driver.request(*scenario.build(context), scenario.content_type)
+
+    # requests are built up front so building them isn't timed
+    requests = [scenario.build(context) for _ in range(repeat)]
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda request: driver.request(*request, scenario.content_type), requests))
+    else:
+        results = [driver.request(*request, scenario.content_type) for request in requests]
+    wall = time.perf_counter() - started
+
+    # failed requests (e.g. a 401 or a throttled 429) are usually fast,
+    # timing them would flatter the percentiles
+    timings = [elapsed for status, elapsed, _ in results if status in scenario.expect]
+    stats = summarize(timings) if timings else {"mean": float("nan"), "p50": float("nan"), "p95": float("nan")}
+    stats["p99"] = sorted(timings)[min(len(timings) - 1, int(len(timings) * 0.99))] if timings else float("nan")
+    stats["rps"] = len(results) / wall
+    stats["errors"] = len(results) - len(timings)
+    stats["statuses"] = sorted({status for status, _, _ in results if status not in scenario.expect})
+    if driver.counts_queries:
+        stats["queries"] = sum(queries for _, _, queries in results) / len(results)
+    return stats
+
+
+def print_report(results):
+    print(f"{'scenario':<28} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>9} {'queries':>8} {'errors':>7}")
+    for name, stats in results.items():
+        queries = f"{stats['queries']:.1f}" if "queries" in stats else "-"
+        print(f"{name:<28} {stats['p50']:>7.2f}ms {stats['p95']:>7.2f}ms {stats['p99']:>7.2f}ms "
+              f"{stats['rps']:>9.1f} {queries:>8} {stats['errors']:>7}")
+
+
+def compare(results, baseline, threshold):
+    """Returns the regressions of `results` against `baseline`"""
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if stats["p95"] > previous["p95"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95']:.2f}ms -> {stats['p95']:.2f}ms")
+        # any extra query per request is a regression, that's how N+1s show up
+        if "queries" in stats and "queries" in previous and stats["queries"] > previous["queries"] + 0.5:
+            regressions.append(f"{name}: queries {previous['queries']:.1f} -> {stats['queries']:.1f}")
+    return regressions
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server didn't start listening on {host}:{port}")
+
+
+def start_server(kind, port, workers):
+    bind = f"127.0.0.1:{port}"
+    if kind == "uvicorn":
+        command = ["gunicorn", "-c", "bookhiveConfig/gunicorn_asgi.py", "bookhiveConfig.asgi:application"]
+    else:
+        command = ["gunicorn", "bookhiveConfig.wsgi:application", "--bind", bind]
+    env = {**os.environ, "BIND": bind, "WEB_CONCURRENCY": str(workers)}
+    process = subprocess.Popen(command + ["--workers", str(workers)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port("127.0.0.1", port)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="A seeded scratch database, required when benchmarking a server.")
+    parser.add_argument("--books", type=int, default=20000, help="Books to seed into the throwaway database.")
+    parser.add_argument("--users", type=int, default=2000, help="Users to seed into the throwaway database.")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], help="Start a local server and benchmark it over HTTP.")
+    parser.add_argument("--base-url", help="Benchmark an already running server over HTTP.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", help="Only run the scenarios whose name contains this text.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p95 slowdown before failing.")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON.")
+    args = parser.parse_args()
+
+    over_http = bool(args.server or args.base_url)
+    if over_http and not args.database_url:
+        parser.error("--database-url is required to benchmark a server, seed it with benchmarks.fixtures")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # read by the settings, in process and by the server started below
+    os.environ.update(UNTHROTTLED)
+    if args.base_url:
+        print("the server must run with the login throttles off, e.g. " +
+              " ".join(f"{name}={value}" for name, value in UNTHROTTLED.items()))
+    setup_django()
+
+    from contextlib import nullcontext
+    mode = "http" if over_http else "inprocess"
+    iterations = args.repeat + args.warmup
+    selected = [s for s in scenarios() if not args.only or args.only in s.name]
+    server = None
+
+    with nullcontext() if args.database_url else test_database():
+        if not args.database_url:
+            from benchmarks.fixtures import seed
+            seed(books=args.books, users=args.users, stdout=sys.stdout)
+        context = RunContext(iterations)
+        try:
+            if args.server:
+                server = start_server(args.server, args.port, args.workers)
+            driver = HttpDriver(args.base_url or f"http://127.0.0.1:{args.port}") if over_http else InProcessDriver()
+            results = {
+                scenario.name: run_scenario(driver, scenario, context, args.repeat, args.warmup, args.concurrency)
+                for scenario in selected
+            }
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    print_report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    # a run with failed requests measures the failures, it's neither
+    # compared with nor saved as the baseline
+    failed = {name: stats for name, stats in results.items() if stats["errors"]}
+    for name, stats in failed.items():
+        print(f"ERROR {name}: {stats['errors']} unexpected response(s), status {stats['statuses']}")
+    if failed:
+        sys.exit(1)
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baselines[mode] = results
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True))
+        print(f"baseline saved to {args.baseline}")
+        return
+    if mode in baselines:
+        regressions = compare(results, baselines[mode], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
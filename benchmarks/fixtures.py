@@ -0,0 +1,116 @@
+"""
+Seeds a benchmark dataset of users and books.
+
+    python -m benchmarks.fixtures --database-url postgres://.../bookhive_bench --books 1000000 --users 100000
+
+Rows are generated lazily and inserted with `bulk_create`, so memory use
+doesn't depend on the dataset size. Every user shares one precomputed
+password hash, since hashing 100k passwords would dominate the run.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+
+BENCH_PASSWORD = "Bench_user!1"
+
+TITLE_WORDS = [
+    "shadow", "river", "empire", "garden", "winter", "machine", "silent", "house", "storm", "glass",
+    "kingdom", "night", "ocean", "fire", "secret", "city", "mountain", "dream", "iron", "song",
+]
+SURNAMES = [
+    "Austen", "Herbert", "Le Guin", "Tolkien", "Morrison", "Achebe", "Orwell", "Butler", "Atwood", "Pratchett",
+    "Adichie", "Murakami", "Ishiguro", "Rowling", "Gaiman", "Asimov", "Christie", "Dickens", "Woolf", "Baldwin",
+]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def generate_users(count, password_hash, seed=0):
+    from users.models import CustomUser
+    rng = random.Random(seed)
+    for i in range(count):
+        email = f"bench_user_{i}@bookhive.io"
+        yield CustomUser(
+            email=email,
+            username=email,
+            first_name=rng.choice(TITLE_WORDS).title(),
+            last_name=rng.choice(SURNAMES),
+            password=password_hash,
+            user_type="user",
+        )
+
+
+def generate_books(count, owner_ids, seed=0):
+    from books.models import Book
+    rng = random.Random(seed)
+    start = date(1900, 1, 1)
+    for i in range(count):
+        # roughly one in five books is uploaded by a normal user
+        owner_id = rng.choice(owner_ids) if owner_ids and rng.random() < 0.2 else None
+        yield Book(
+            title=" ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 4))).title(),
+            author=f"{rng.choice(TITLE_WORDS).title()} {rng.choice(SURNAMES)}",
+            publication_date=start + timedelta(days=rng.randint(0, 45000)),
+            isbn=f"978{i:010d}",
+            tag="custom" if owner_id else "admin",
+            owner_id=owner_id,
+        )
+
+
+def seed(books=10000, users=1000, batch_size=5000, random_seed=0, stdout=None):
+    """
+    Inserts `users` users and `books` books and returns the ids of the
+    created users. Safe to run on an empty database only.
+    """
+    from django.contrib.auth.hashers import make_password
+    from books.models import Book
+    from users.models import CustomUser
+
+    def log(message):
+        if stdout:
+            stdout.write(message + "\n")
+
+    started = time.perf_counter()
+    password_hash = make_password(BENCH_PASSWORD)
+    for batch in batched(generate_users(users, password_hash, random_seed), batch_size):
+        CustomUser.objects.bulk_create(batch)
+    owner_ids = list(CustomUser.objects.filter(email__startswith="bench_user_").values_list("id", flat=True))
+    log(f"seeded {len(owner_ids)} users in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    created = 0
+    for batch in batched(generate_books(books, owner_ids, random_seed), batch_size):
+        Book.objects.bulk_create(batch)
+        created += len(batch)
+    log(f"seeded {created} books in {time.perf_counter() - started:.1f}s")
+    return owner_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="A scratch database, it is migrated and seeded.")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from benchmarks import setup_django
+    os.environ["DATABASE_URL"] = args.database_url
+    setup_django()
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+    seed(books=args.books, users=args.users, batch_size=args.batch_size, random_seed=args.seed, stdout=sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
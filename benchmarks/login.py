@@ -0,0 +1,49 @@
+"""
+Measures password verification throughput, i.e. the ceiling on logins per
+second: verifying inline (what login_user used to do on the request
+thread) against the bounded hashing pool at increasing sizes.
+
+    python -m benchmarks.login [--logins 200] [--hasher pbkdf2]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import wait
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--hasher", default=None, help="One of PASSWORD_HASHER_CLASSES, defaults to PASSWORD_HASHER.")
+    args = parser.parse_args()
+
+    if args.hasher:
+        os.environ["PASSWORD_HASHER"] = args.hasher
+    setup_django()
+    from django.contrib.auth.hashers import make_password
+    from bookhiveConfig.hashing import HashingPool, verify_password
+
+    encoded = make_password("Bench_user!1")
+    cores = os.cpu_count() or 1
+    print(f"hasher: {encoded.split('$')[0]}, cores: {cores}")
+
+    started = time.perf_counter()
+    for _ in range(args.logins):
+        assert verify_password("Bench_user!1", encoded)[0]
+    inline = args.logins / (time.perf_counter() - started)
+    print(f"{'inline':<10} {inline:>8.1f} logins/s")
+
+    workers = 1
+    while workers <= cores:
+        pool = HashingPool(workers=workers, max_pending=args.logins)
+        started = time.perf_counter()
+        futures = [pool.submit(verify_password, "Bench_user!1", encoded) for _ in range(args.logins)]
+        wait(futures)
+        rate = args.logins / (time.perf_counter() - started)
+        print(f"{f'pool x{workers}':<10} {rate:>8.1f} logins/s {rate / workers:>8.1f} per core")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
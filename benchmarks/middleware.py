@@ -0,0 +1,73 @@
+"""
+Measures the per-request overhead of AuthMiddleware's route matching: the
+original per-request list of three compiled regexes against the route
+registry built once from the routers' `auth=` declarations.
+
+    python -m benchmarks.middleware [--repeat 200000]
+"""
+import argparse
+import re
+import time
+from benchmarks import setup_django
+
+
+PATHS = [
+    ("GET", "/api/book_mgt/books"),
+    ("POST", "/api/user_mgt/login"),
+    ("GET", "/api/book_mgt/books/42"),
+    ("GET", "/api/user_mgt/users/7"),
+    ("GET", "/admin/login/"),
+]
+
+
+def original_is_protected(path, method):
+    # AuthMiddleware.process_request before the route registry
+    PROTECTED_ENDPOINTS = [
+        re.compile(r'^/api/user_mgt/users/?$'),
+        re.compile(r'^/api/user_mgt/users/\d+$'),
+        re.compile(r'^/api/book_mgt/books/\d+$'),
+    ]
+    return any(pattern.match(path) for pattern in PROTECTED_ENDPOINTS)
+
+
+def per_call_ns(func, method, path, repeat):
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        func(path, method)
+    return (time.perf_counter_ns() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from bookhiveConfig.middleware import AuthMiddleware
+    from bookhiveConfig.routes import ProtectedRoutes
+
+    started = time.perf_counter()
+    routes = ProtectedRoutes.from_urlconf()
+    print(f"registry: {len(routes.routes)} protected route(s) built in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    print(f"{'request':<32} {'original':>10} {'registry':>10}")
+    for method, path in PATHS:
+        before = per_call_ns(original_is_protected, method, path, args.repeat)
+        after = per_call_ns(routes.is_protected, method, path, args.repeat)
+        print(f"{method + ' ' + path:<32} {before:>8.0f}ns {after:>8.0f}ns")
+
+    # the whole middleware on unprotected traffic, with a no-op view
+    factory = RequestFactory()
+    middleware = AuthMiddleware(lambda request: HttpResponse())
+    request = factory.get("/api/book_mgt/books")
+    repeat = args.repeat // 10
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        middleware(request)
+    print(f"AuthMiddleware, unprotected request: {(time.perf_counter_ns() - start) / repeat:.0f}ns per request")
+
+
+if __name__ == "__main__":
+    main()
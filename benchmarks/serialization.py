@@ -0,0 +1,52 @@
+"""
+Compares the original list serialization path (full model instances, one
+pydantic model per row, JsonResponse's stdlib encoder) with the fast path
+(`.values()` columns, batch validation through a cached TypeAdapter and
+the orjson-backed FastJsonResponse) for 10/100/1000-row pages.
+
+    python -m benchmarks.serialization [--repeat 50]
+"""
+import argparse
+from datetime import date
+from benchmarks import measure, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.http import JsonResponse
+    from bookhiveConfig.serialization import orjson, schema_fields, serialize_rows
+    from bookhiveConfig.utils import FastJsonResponse
+    from books.models import Book
+    from books.schemas import BookResponseSchema
+    from books.views import DATETIME_FIELDS, return_book_data
+
+    def original(size):
+        books = [return_book_data(book) for book in Book.objects.order_by("-id")[:size]]
+        return JsonResponse({"status": "success", "data": {"books": books}, "message": "ok"})
+
+    def fast(size):
+        rows = Book.objects.order_by("-id").values(*schema_fields(BookResponseSchema))[:size]
+        books = serialize_rows(BookResponseSchema, rows, DATETIME_FIELDS)
+        return FastJsonResponse({"status": "success", "data": {"books": books}, "message": "ok"})
+
+    with test_database():
+        Book.objects.bulk_create(
+            Book(title=f"Book {i}", author=f"Author {i % 50}", publication_date=date(2000, 1, 1),
+                 isbn=f"{i:013d}", tag="admin")
+            for i in range(1000)
+        )
+        print(f"encoder: {'orjson' if orjson else 'stdlib json'}")
+        print(f"{'rows':>6} {'original p50':>14} {'fast p50':>10} {'speedup':>8}")
+        for size in (10, 100, 1000):
+            assert original(size).content.count(b'"id"') == fast(size).content.count(b'"id"')
+            before = summarize(measure(lambda: original(size), repeat=args.repeat))
+            after = summarize(measure(lambda: fast(size), repeat=args.repeat))
+            print(f"{size:>6} {before['p50']:>12.3f}ms {after['p50']:>8.3f}ms {before['p50'] / after['p50']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,155 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
 from ninja import NinjaAPI
 from ninja.security import HttpBearer
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from rest_framework.exceptions import AuthenticationFailed
 
 
+class TokenUserCache:
+    """
+    A bounded, thread-safe LRU cache mapping raw access tokens to the users
+    they resolve to. An entry lives until the token's `exp`, capped at
+    `max_ttl` seconds so workers that didn't see a user change don't serve
+    a stale user for the whole token lifetime. Every request gets its own
+    copy of the user, so what one request sets on it (e.g. a cached
+    relation) isn't seen by the others.
+    """
+
+    def __init__(self, max_size=10000, max_ttl=60):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+        return copy.copy(user)
+
+    def set(self, token, user, exp):
+        expires_at = min(exp, time.time() + self.max_ttl)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (copy.copy(user), expires_at)
+            self._tokens_by_user.setdefault(user.pk, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[0].pk)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].pk]
+
+
+jwt_authentication = JWTAuthentication()
+token_user_cache = TokenUserCache(
+    max_size=getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 10000),
+    max_ttl=getattr(settings, "AUTH_TOKEN_CACHE_TTL", 60),
+)
+
+
+def authenticate_token(request, token: str):
+    """
+    Resolves a raw access token to its user, verifying it at most once per
+    request (the middleware and BearerAuth share the result) and reusing
+    earlier resolutions of the same token from `token_user_cache`. The user
+    is also set as `request.user`, so handlers don't fall back to the session.
+    Raises AuthenticationFailed if the token or the user is invalid.
+    """
+    user = getattr(request, "_token_user", None)
+    if user is not None:
+        return user
+
+    user = token_user_cache.get(token)
+    if user is None:
+        validated_token = jwt_authentication.get_validated_token(token)
+        user = jwt_authentication.get_user(validated_token)
+        token_user_cache.set(token, user, validated_token["exp"])
+    request._token_user = request.user = user
+    return user
+
+
+async def aget_token_user(validated_token):
+    # mirrors JWTAuthentication.get_user with a native async query
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+    try:
+        user = await jwt_authentication.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+    except jwt_authentication.user_model.DoesNotExist:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if not user.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    if getattr(api_settings, "CHECK_REVOKE_TOKEN", False):
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+    return user
+
+
+async def aauthenticate_token(request, token: str):
+    """
+    The async counterpart of `authenticate_token`. Signature checks are
+    pure CPU work, so only the user lookup needs the async ORM.
+    """
+    user = getattr(request, "_token_user", None)
+    if user is not None:
+        return user
+
+    user = token_user_cache.get(token)
+    if user is None:
+        validated_token = jwt_authentication.get_validated_token(token)
+        user = await aget_token_user(validated_token)
+        token_user_cache.set(token, user, validated_token["exp"])
+    request._token_user = request.user = user
+    return user
+
+
 class BearerAuth(HttpBearer):
     def authenticate(self, request, token: str):
         # verify the token and return the user or raise an error
-        user, _ = JWTAuthentication().authenticate(request)
+        user = authenticate_token(request, token)
+        if not user:
+            raise AuthenticationFailed("Invalid token")
+        return user
+
+
+class AsyncBearerAuth(HttpBearer):
+    # ninja sees authenticate is a coroutine and awaits it instead of
+    # running it on a thread
+    async def authenticate(self, request, token: str):
+        # verify the token and return the user or raise an error
+        user = await aauthenticate_token(request, token)
         if not user:
             raise AuthenticationFailed("Invalid token")
         return user
@@ -20,11 +162,12 @@ class CustomNinjaAPI(NinjaAPI):
     """
 
     @staticmethod
-    def create_api(title, description, version="1.0.0"):
+    def create_api(title, description, version="1.0.0", urls_namespace=None):
         return CustomNinjaAPI(
             auth=None, 
             title=title,
             description=description,
-            version=version
+            version=version,
+            urls_namespace=urls_namespace
         )
 
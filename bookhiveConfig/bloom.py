@@ -0,0 +1,46 @@
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """
+    A fixed size Bloom filter: `in` never misses an added item and wrongly
+    matches a missing one with a probability of about `error_rate` while
+    fewer than `capacity` items have been added. Items can't be removed.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        # bit updates are read-modify-write, a lost one would be a false negative
+        self._lock = threading.Lock()
+
+    def _positions(self, item):
+        # double hashing: k positions out of the two halves of one digest
+        digest = hashlib.blake2b(str(item).encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def is_full(self):
+        # past its capacity the false positive rate climbs quickly
+        return self.count > self.capacity
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+
+class ReadThroughCache:
+    """
+    A read-through cache for serialized payloads, keyed by a namespace and
+    an object id.
+
+    On a miss, only one caller per key rebuilds the payload: threads of the
+    same process wait on a local lock, and other processes wait on a short
+    lived `cache.add` lock (atomic on locmem, redis and memcached) instead
+    of all hitting the database at once.
+    """
+
+    def __init__(self, namespace, alias="default", timeout=DEFAULT_TIMEOUT, lock_timeout=5):
+        self.namespace = namespace
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        # striped locks keep memory bounded no matter how many keys are seen
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, pk):
+        return f"{self.namespace}:{pk}"
+
+    def get_or_load(self, pk, loader):
+        key = self.key(pk)
+        value = self.cache.get(key)
+        if value is not None:
+            stats.hit(self.namespace)
+            return value
+
+        with self._lock_for(key):
+            # another thread may have filled the key while we waited
+            value = self.cache.get(key)
+            if value is not None:
+                stats.hit(self.namespace)
+                return value
+            stats.miss(self.namespace)
+            return self._load(key, loader)
+
+    async def aget_or_load(self, pk, loader):
+        """
+        The async counterpart of `get_or_load`, `loader` is a coroutine
+        function. Concurrent misses are coalesced through the shared
+        `cache.aadd` lock alone, since asyncio locks can't be shared
+        between the event loops of different threads.
+        """
+        key = self.key(pk)
+        value = await self.cache.aget(key)
+        if value is not None:
+            stats.hit(self.namespace)
+            return value
+        stats.miss(self.namespace)
+
+        lock_key, token = f"{key}:lock", uuid.uuid4().hex
+        if not await self.cache.aadd(lock_key, token, self.lock_timeout):
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                value = await self.cache.aget(key)
+                if value is not None:
+                    return value
+        try:
+            value = await loader()
+            await self.cache.aset(key, value, self.timeout)
+            return value
+        finally:
+            # after a timed out wait the lock is someone else's
+            if await self.cache.aget(lock_key) == token:
+                await self.cache.adelete(lock_key)
+
+    def invalidate(self, pk, using=None):
+        self.invalidate_many([pk], using)
+
+    def invalidate_many(self, pks, using=None, batch_size=1000):
+        """
+        Drops the cached payloads once the current transaction commits.
+        Dropped before, a concurrent miss could reload the old row and
+        cache it for `timeout` seconds.
+        """
+        keys = [self.key(pk) for pk in pks]
+
+        def drop():
+            for start in range(0, len(keys), batch_size):
+                self.cache.delete_many(keys[start:start + batch_size])
+
+        transaction.on_commit(drop, using=using)
+
+    def _lock_for(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    def _load(self, key, loader):
+        lock_key, token = f"{key}:lock", uuid.uuid4().hex
+        if not self.cache.add(lock_key, token, self.lock_timeout):
+            # another process is loading the key, give it a chance to finish
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self.cache.get(key)
+                if value is not None:
+                    return value
+        try:
+            value = loader()
+            self.cache.set(key, value, self.timeout)
+            return value
+        finally:
+            # after a timed out wait the lock is someone else's
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+
+class CacheStats:
+    """Thread-safe, per-process hit/miss counters for every namespace"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def hit(self, namespace):
+        with self._lock:
+            self._counters[namespace]["hits"] += 1
+
+    def miss(self, namespace):
+        with self._lock:
+            self._counters[namespace]["misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = CacheStats()
+
+book_cache = ReadThroughCache("book", timeout=settings.DETAIL_CACHE_TIMEOUT)
+user_cache = ReadThroughCache("user", timeout=settings.DETAIL_CACHE_TIMEOUT)
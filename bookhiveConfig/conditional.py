@@ -0,0 +1,44 @@
+import hashlib
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    # a strong validator derived from whatever identifies a representation
+    return f'"{hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()}"'
+
+
+def rows_etag(rows, meta):
+    """
+    The ETag of a list page: every row's id and `date_updated`, plus the
+    pagination meta, so edits, inserts and deletes on the page (or a new
+    total) all change it.
+    """
+    return make_etag([(row["id"], row["date_updated"]) for row in rows], sorted(meta.items()))
+
+
+def rows_last_modified(rows):
+    return max((row["date_updated"] for row in rows), default=None)
+
+
+def is_conditional(request):
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+def set_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Returns a 304 response when the client's copy, per `If-None-Match` or
+    `If-Modified-Since`, is still fresh, otherwise None.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,23 @@
+from django.db import connections
+
+
+def pool_stats(alias):
+    """
+    The connection settings of a database and the statistics of its pool:
+    psycopg 3's own pool, or the in-process psycopg2 pool.
+    """
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    stats = {
+        "vendor": connection.vendor,
+        "conn_max_age": settings_dict.get("CONN_MAX_AGE"),
+        "conn_health_checks": settings_dict.get("CONN_HEALTH_CHECKS"),
+        "pool": None,
+    }
+    if hasattr(connection, "get_connection_pool"):
+        pool = connection.get_connection_pool()
+        if pool is not None:
+            stats["pool"] = {"kind": "psycopg2", **pool.get_stats()}
+    elif settings_dict.get("OPTIONS", {}).get("pool") and connection.pool is not None:
+        stats["pool"] = {"kind": "psycopg", **connection.pool.get_stats()}
+    return stats
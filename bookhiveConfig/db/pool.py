@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool's timeout"""
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of DB-API connections for drivers without a pool of
+    their own (psycopg2). At most `max_size` connections are open or handed
+    out at once, `getconn` waits up to `timeout` seconds for one to free up.
+    Idle connections are reused most recently returned first, and those
+    beyond `min_size` are closed after `max_idle` seconds.
+
+    `check(connection)` runs before an idle connection is reused and
+    `reset(connection)` when it's returned, either may raise to have the
+    connection discarded.
+    """
+
+    def __init__(self, connect, min_size=0, max_size=10, timeout=10, max_idle=300, check=None, reset=None):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._check = check
+        self._reset = reset
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "size": 0,
+            "requests": 0,
+            "requests_waited": 0,
+            "requests_timed_out": 0,
+            "connections_opened": 0,
+            "connections_discarded": 0,
+        }
+
+    def getconn(self):
+        waited = not self._slots.acquire(blocking=False)
+        if waited and not self._slots.acquire(timeout=self.timeout):
+            self._count("requests_timed_out")
+            raise PoolTimeout(f"Couldn't get a database connection within {self.timeout}s")
+        try:
+            self._count("requests")
+            if waited:
+                self._count("requests_waited")
+            while True:
+                with self._lock:
+                    idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    return self._open()
+                connection = idle[0]
+                if self._usable(connection, self._check):
+                    return connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection):
+        try:
+            if self._usable(connection, self._reset):
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+            self._close_expired()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, idle=len(self._idle))
+        stats.update(
+            in_use=stats["size"] - stats["idle"],
+            min_size=self.min_size,
+            max_size=self.max_size,
+            timeout=self.timeout,
+        )
+        return stats
+
+    def _open(self):
+        connection = self._connect()
+        with self._lock:
+            self._stats["size"] += 1
+            self._stats["connections_opened"] += 1
+        return connection
+
+    def _usable(self, connection, test):
+        if getattr(connection, "closed", False):
+            self._discard(connection)
+            return False
+        if test is not None:
+            try:
+                test(connection)
+            except Exception:
+                self._discard(connection)
+                return False
+        return True
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats["size"] -= 1
+            self._stats["connections_discarded"] += 1
+
+    def _close_expired(self):
+        # the oldest idle connections sit at the left end of the deque
+        expired = []
+        deadline = time.monotonic() - self.max_idle
+        with self._lock:
+            while len(self._idle) > self.min_size and self._idle[0][1] < deadline:
+                expired.append(self._idle.popleft()[0])
+        for connection in expired:
+            self._discard(connection)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
@@ -0,0 +1,80 @@
+"""
+The PostgreSQL backend with an in-process connection pool for psycopg2,
+which, unlike psycopg 3, has no pool Django can use. Enabled through
+DATABASE_POOL=psycopg2, the pool options are read from the `POOL` key of
+the database settings.
+"""
+import threading
+from psycopg2 import extensions, extras
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.db.backends.base.base import NO_DB_ALIAS
+from ..pool import ConnectionPool
+
+
+def check_connection(connection):
+    # a round trip, so connections dropped by the server aren't handed out
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def reset_connection(connection):
+    # roll back whatever the last request left open before reusing it
+    status = connection.info.transaction_status
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        raise ValueError("Connection is broken")
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # pools are per process and shared by the threads' connection wrappers
+    _psycopg2_pools = {}
+    _psycopg2_pools_lock = threading.Lock()
+
+    def get_connection_pool(self, conn_params=None):
+        options = self.settings_dict.get("POOL")
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        with self._psycopg2_pools_lock:
+            pool = self._psycopg2_pools.get(self.alias)
+            if pool is None and conn_params is not None:
+                if self.settings_dict.get("CONN_MAX_AGE", 0) != 0:
+                    raise ImproperlyConfigured("Pooling doesn't support persistent connections.")
+                pool = self._psycopg2_pools[self.alias] = ConnectionPool(
+                    connect=lambda: self.Database.connect(**conn_params),
+                    check=check_connection if self.settings_dict["CONN_HEALTH_CHECKS"] else None,
+                    reset=reset_connection,
+                    **options,
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_connection_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        # mirrors the psycopg2 path of the parent with the pool as the source
+        connection = pool.getconn()
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = IsolationLevel(isolation_level or IsolationLevel.READ_COMMITTED)
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        pool = self.get_connection_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+            self.connection = None
+
+    def close_pool(self):
+        super().close_pool()
+        with self._psycopg2_pools_lock:
+            pool = self._psycopg2_pools.pop(self.alias, None)
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,24 @@
+"""
+Gunicorn profile for serving BookHive over ASGI:
+
+    gunicorn -c bookhiveConfig/gunicorn_asgi.py bookhiveConfig.asgi:application
+
+Each uvicorn worker runs one event loop. The async handlers (book/user
+listings and lookups, book creation and export) wait on the database
+without holding a thread, so one worker keeps hundreds of slow clients
+open. The remaining sync handlers run on a small thread pool, capped
+by ASGI_THREADS.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# an event loop per core is enough, extra workers only add memory
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# slow clients are cheap on an event loop, so don't cut them off early
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+# caps asgiref's thread pool used by the sync handlers and middleware
+os.environ.setdefault("ASGI_THREADS", "16")
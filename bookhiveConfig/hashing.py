@@ -0,0 +1,117 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class PoolSaturated(Exception):
+    """Raised when the hashing pool already has as much work as it accepts"""
+
+
+class HashingPool:
+    """
+    Runs password hashing on a bounded pool of threads. PBKDF2 (hashlib),
+    argon2 and bcrypt release the GIL while hashing, so the threads hash in
+    parallel without blocking the worker's event loop or request threads.
+
+    At most `max_pending` hashes may be queued or running at once, further
+    calls fail fast with PoolSaturated rather than piling up behind a burst.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # created lazily so forked workers don't inherit the parent's threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    def submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated("Too many logins in progress, please try again shortly")
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, func, *args):
+        return self.submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+
+def _setup_hashing_process():
+    # spawned processes (macOS, Windows) start without django set up, the
+    # settings module comes through the inherited environment
+    import django
+    django.setup()
+
+
+class BulkHasher:
+    """
+    Hashes batches of new passwords in parallel for bulk user imports, as
+    a context manager that owns its executor. With `processes`, hashing
+    runs on a process pool, free of the GIL whatever the hasher, which
+    suits offline loads like the import_users command. Request handlers
+    keep the default threads: forking a serving worker isn't safe, and the
+    built-in hashers release the GIL anyway.
+    """
+
+    def __init__(self, workers=None, processes=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self._executor = None
+
+    def __enter__(self):
+        if self.processes:
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_setup_hashing_process)
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bulk-hashing")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown()
+        self._executor = None
+
+    def __call__(self, passwords):
+        # the hashes of `passwords`, in order
+        passwords = list(passwords)
+        # a few big chunks per process keep the pickling overhead down
+        chunksize = max(len(passwords) // (self.workers * 4), 1) if self.processes else 1
+        return list(self._executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def verify_password(password, encoded):
+    """
+    Checks `password` against an encoded hash and returns `(valid, upgraded)`
+    where `upgraded` is a new hash when the stored one should be replaced,
+    i.e. it was made by another hasher than the preferred one (the first of
+    PASSWORD_HASHERS) or with outdated parameters.
+    """
+    if encoded is None:
+        # hash anyway so unknown emails take as long as wrong passwords
+        make_password(password)
+        return False, None
+    upgraded = []
+    valid = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+hashing_pool = HashingPool(
+    workers=settings.LOGIN_HASH_WORKERS,
+    max_pending=settings.LOGIN_HASH_MAX_PENDING,
+)
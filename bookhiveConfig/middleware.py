@@ -1,42 +1,276 @@
-import re
-from django.utils.deprecation import MiddlewareMixin
-from rest_framework_simplejwt.authentication import JWTAuthentication
+import logging
+import random
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.core.cache import cache
+from django.db import DatabaseError, connections
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth.models import AnonymousUser
+from .auth import aauthenticate_token, authenticate_token
+from . import metrics
+from .routers import current_replica, replica_health
+from .routes import ProtectedRoutes
+from .throttling import client_ip
 from .utils import CustomResponse
 
-class AuthMiddleware(MiddlewareMixin):
+
+logger = logging.getLogger("bookhive.performance")
+
+
+class AuthMiddleware:
     """
     A Middleware to handle JWT authentication for all incoming requests.
     This middleware checks for the presence and validity of the JWT token
     in the Authorization header and sets the request.user attribute.
+
+    Only the routes declared with a bearer `auth=` are checked, they are
+    collected from the urlconf once when the middleware is loaded. It runs
+    natively under both WSGI and ASGI, so async requests don't pay for a
+    thread hop on every request.
     """
+    sync_capable = True
+    async_capable = True
 
-    def process_request(self, request):
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.protected_routes = ProtectedRoutes.from_urlconf()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_request(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.aprocess_request(request) or await self.get_response(request)
+
+    def get_token(self, request):
         """
-        Process the incoming request to handle JWT authentication.
+        Returns the bearer token of a protected request, or the error
+        response to send instead. Unprotected requests get `(None, None)`.
         """
-        PROTECTED_ENDPOINTS = [
-            re.compile(r'^/api/user_mgt/users/?$'),
-            re.compile(r'^/api/user_mgt/users/\d+$'),
-            re.compile(r'^/api/book_mgt/books/\d+$'),
-        ]
-        # check if the request path matches any of the protected endpoints
-        if not any(pattern.match(request.path) for pattern in PROTECTED_ENDPOINTS):
-            return None # skip middleware for these paths
+        if not self.protected_routes.is_protected(request.path, request.method):
+            return None, None # skip middleware for these paths
 
         # check if the Authorization header is in the correct format
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
+            return auth_header.split(" ")[1], None
+        # handle the case where the token is not provided
+        return None, CustomResponse.failed(message="Authentication credentials were not provided", status=401)
+
+    def process_request(self, request):
+        """
+        Process the incoming request to handle JWT authentication.
+        """
+        token, response = self.get_token(request)
+        if token is None:
+            return response
+        try:
+            # authenticate the token and set the user, BearerAuth
+            # reuses this result instead of verifying the token again
+            request.user = authenticate_token(request, token)
+        except AuthenticationFailed:
+            # handle the case where the token is invalid
+            return CustomResponse.failed(message="Invalid token", status=403)
+
+    async def aprocess_request(self, request):
+        token, response = self.get_token(request)
+        if token is None:
+            return response
+        try:
+            request.user = await aauthenticate_token(request, token)
+        except AuthenticationFailed:
+            return CustomResponse.failed(message="Invalid token", status=403)
+
+
+class QueryRecorder:
+    """
+    Counts the queries run while handling a request and how long they took.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+current_recorder = ContextVar("current_recorder", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # a `connection.execute_wrapper` that reports to the recorder of the
+    # request being handled, if any
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_wrapper(**kwargs):
+    """
+    Connections are per thread, and async views run their queries in a
+    worker thread rather than the one the middleware runs in. This runs on
+    `request_started`, which Django sends from the thread that will run the
+    request's queries, and the wrapper finds the recorder through a context
+    variable since those are copied into that thread.
+    """
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+
+
+class InstrumentationMiddleware:
+    """
+    Records per-route latency, query counts, query time and response sizes
+    into the metrics registry, and logs a warning when a request runs more
+    queries than `QUERY_BUDGET` (that's usually an N+1).
+
+    Routes are labelled by their URL pattern rather than the path, so ids
+    don't blow up the number of series.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        request_started.connect(install_query_wrapper, dispatch_uid="install_query_wrapper")
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, recorder, duration):
+        method = request.method
+        match = getattr(request, "resolver_match", None)
+        route = f"/{match.route}" if match else "unmatched"
+
+        metrics.request_duration.observe(duration, method, route, str(response.status_code))
+        metrics.db_queries.observe(recorder.count, method, route)
+        metrics.db_duration.observe(recorder.duration, method, route)
+        # a streamed body is produced after the response leaves the middleware
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), method, route)
+
+        if recorder.count > settings.QUERY_BUDGET:
+            metrics.query_budget_exceeded.inc(method, route)
+            logger.warning(
+                "%s %s ran %d queries (budget %d) in %.1fms",
+                method, request.path, recorder.count, settings.QUERY_BUDGET, duration * 1000,
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Reads of GET requests go to a read replica, picked at random among the
+    reachable ones. A client that just made a successful write is pinned to
+    the primary for DATABASE_REPLICA_PIN_SECONDS so it reads its own writes
+    despite replication lag. Clients are identified by their token's user
+    and by their IP, and the pins live in the cache so workers share them.
+    """
+    sync_capable = True
+    async_capable = True
+    read_methods = ("GET", "HEAD")
+
+    def __init__(self, get_response, replicas=None):
+        self.replicas = list(settings.DATABASE_REPLICAS if replicas is None else replicas)
+        if not self.replicas:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def pin_keys(self, request):
+        keys = [f"replica_pin:ip:{client_ip(request)}"]
+        # set by AuthMiddleware on protected routes
+        user = getattr(request, "_token_user", None)
+        if user is not None:
+            keys.append(f"replica_pin:user:{user.pk}")
+        return keys
+
+    def should_pin(self, request, response):
+        return request.method not in self.read_methods and response.status_code < 400
+
+    def pick_replica(self):
+        # connecting up front means an unreachable replica is skipped before
+        # the view runs, rather than failing the request halfway through
+        for alias in random.sample(self.replicas, len(self.replicas)):
+            if not replica_health.is_up(alias):
+                continue
             try:
-                # authenticate the token and set the user
-                user, _ = JWTAuthentication().authenticate(request)
-                request.user = user
-            except AuthenticationFailed:
-                # handle the case where the token is invalid
-                return CustomResponse.failed(message="Invalid token", status=403)
-        else:
-            # handle the case where the token is not provided
-            return CustomResponse.failed(message="Authentication credentials were not provided", status=401)
+                connections[alias].ensure_connection()
+                return alias
+            except DatabaseError:
+                logger.warning("Replica %s is unavailable, reading from the primary", alias)
+                replica_health.mark_down(alias)
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        replica = None
+        if request.method in self.read_methods and not cache.get_many(self.pin_keys(request)):
+            replica = self.pick_replica()
+        token = current_replica.set(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        if self.should_pin(request, response):
+            cache.set_many(dict.fromkeys(self.pin_keys(request), True), timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
 
+    async def __acall__(self, request):
+        replica = None
+        if request.method in self.read_methods and not await cache.aget_many(self.pin_keys(request)):
+            # in the thread the request's queries will run in
+            replica = await sync_to_async(self.pick_replica)()
+        token = current_replica.set(replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        if self.should_pin(request, response):
+            await cache.aset_many(
+                dict.fromkeys(self.pin_keys(request), True), timeout=settings.DATABASE_REPLICA_PIN_SECONDS
+            )
+        return response
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from .auth import *
+from .cache import stats as cache_stats
+from .db import pool_stats
+from .metrics import registry
+from .routers import replica_health
+from .utils import CustomResponse
+
+
+api = CustomNinjaAPI.create_api(
+    title="BookHive Ops API",
+    description="This documentation provides admin-only endpoints for monitoring the service.",
+    version="1.0.0",
+    urls_namespace="ops"
+)
+
+
+def admin_only(request):
+    # normal users don't get to see operational data
+    if request.user.user_type == "user":
+        return CustomResponse.failed(message="You do not have the permission to view this resource.", status=403)
+    return None
+
+
+@api.get("/cache/stats", response=dict, auth=BearerAuth())
+def get_cache_stats(request):
+    denied = admin_only(request)
+    if denied:
+        return denied
+    return CustomResponse.success(data=cache_stats.snapshot(), message="Cache statistics retrieved successfully")
+
+
+@api.get("/db/pool", response=dict, auth=BearerAuth())
+def get_db_pool_stats(request):
+    denied = admin_only(request)
+    if denied:
+        return denied
+    data = {alias: pool_stats(alias) for alias in connections}
+    for alias in settings.DATABASE_REPLICAS:
+        data[alias]["available"] = replica_health.is_up(alias)
+    return CustomResponse.success(data=data, message="Database pool statistics retrieved successfully")
+
+
+@api.get("/metrics", auth=BearerAuth())
+def get_metrics(request):
+    denied = admin_only(request)
+    if denied:
+        return denied
+    # the Prometheus text exposition format, not the usual JSON envelope
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
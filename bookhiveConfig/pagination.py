@@ -0,0 +1,149 @@
+import base64
+import json
+import math
+from django.core.paginator import Paginator
+
+
+class InvalidCursor(ValueError):
+    """Raised when an `after`/`before` token cannot be decoded"""
+
+
+def encode_cursor(value) -> str:
+    # cursors are opaque to clients, they only carry the keyset value
+    # of the row at the edge of a page
+    raw = json.dumps({"k": value}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode()))["k"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(value, int):
+        raise InvalidCursor("Invalid cursor")
+    return value
+
+
+def key_of(row, key):
+    # rows are either model instances or `.values()` dicts
+    return row[key] if isinstance(row, dict) else getattr(row, key)
+
+
+def paginate_by_page(queryset, page, size, include_total=True, count=None):
+    """
+    Classic page/size pagination. When `include_total` is False the
+    COUNT(*) query is skipped and one extra row is fetched instead to
+    find out whether there is a next page. A `count` known beforehand
+    (e.g. a maintained counter) also spares the COUNT(*).
+    """
+    page, size = int(page), int(size)
+    if include_total:
+        paginator = Paginator(queryset, size)
+        if count is not None:
+            # Paginator.count is a cached_property
+            paginator.count = count
+        paginated = paginator.get_page(page)
+        return list(paginated.object_list), {
+            "page": page,
+            "size": size,
+            "total_pages": paginator.num_pages,
+            "total": paginator.count,
+        }
+
+    offset = (max(page, 1) - 1) * size
+    rows = list(queryset[offset:offset + size + 1])
+    return _page_without_total(rows, page, size)
+
+
+async def apaginate_by_page(queryset, page, size, include_total=True, count=None):
+    # the async counterpart of paginate_by_page, it mirrors Paginator.get_page
+    page, size = int(page), int(size)
+    if include_total:
+        total = await queryset.acount() if count is None else count
+        num_pages = max(math.ceil(total / size), 1)
+        number = min(max(page, 1), num_pages)
+        offset = (number - 1) * size
+        rows = [row async for row in queryset[offset:offset + size]]
+        return rows, {
+            "page": page,
+            "size": size,
+            "total_pages": num_pages,
+            "total": total,
+        }
+
+    offset = (max(page, 1) - 1) * size
+    rows = [row async for row in queryset[offset:offset + size + 1]]
+    return _page_without_total(rows, page, size)
+
+
+def _page_without_total(rows, page, size):
+    return rows[:size], {
+        "page": page,
+        "size": size,
+        "has_next": len(rows) > size,
+    }
+
+
+def paginate_by_cursor(queryset, size, after=None, before=None, include_total=False, key="id", descending=True,
+                       count=None):
+    """
+    Keyset pagination over a unique, indexed column (the primary key by
+    default). Unlike OFFSET pagination, the cost of a page doesn't grow
+    with its depth, since every page is a range scan that starts at the
+    cursor's value.
+    """
+    size = int(size)
+    # total must be counted before the keyset filters are applied
+    total = (queryset.count() if count is None else count) if include_total else None
+    page_query = _cursor_query(queryset, size, after, before, key, descending)
+    return _cursor_page(list(page_query), size, after, before, key, total)
+
+
+async def apaginate_by_cursor(queryset, size, after=None, before=None, include_total=False, key="id", descending=True,
+                              count=None):
+    # the async counterpart of paginate_by_cursor
+    size = int(size)
+    total = (await queryset.acount() if count is None else count) if include_total else None
+    page_query = _cursor_query(queryset, size, after, before, key, descending)
+    return _cursor_page([row async for row in page_query], size, after, before, key, total)
+
+
+def _cursor_query(queryset, size, after, before, key, descending):
+    if after and before:
+        raise InvalidCursor("Only one of 'after' or 'before' may be provided")
+
+    forward_order = f"-{key}" if descending else key
+    backward_order = key if descending else f"-{key}"
+    # "past" the cursor in the direction of travel
+    after_lookup = f"{key}__lt" if descending else f"{key}__gt"
+    before_lookup = f"{key}__gt" if descending else f"{key}__lt"
+
+    # one extra row is fetched to know whether there's more in that direction
+    if before:
+        return queryset.filter(**{before_lookup: decode_cursor(before)}).order_by(backward_order)[:size + 1]
+    queryset = queryset.order_by(forward_order)
+    if after:
+        queryset = queryset.filter(**{after_lookup: decode_cursor(after)})
+    return queryset[:size + 1]
+
+
+def _cursor_page(rows, size, after, before, key, total):
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if before:
+        # rows were fetched walking backwards from the cursor
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(after), has_more
+
+    meta = {
+        "size": size,
+        "next_cursor": encode_cursor(key_of(rows[-1], key)) if rows and has_next else None,
+        "prev_cursor": encode_cursor(key_of(rows[0], key)) if rows and has_prev else None,
+    }
+    if total is not None:
+        meta["total"] = total
+    return rows, meta
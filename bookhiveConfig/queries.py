@@ -0,0 +1,8 @@
+def filter_iprefix(queryset, field, value):
+    """
+    A case-insensitive "starts with" filter. `istartswith` compiles to
+    `UPPER(x::text) LIKE UPPER('v%')` on PostgreSQL, which the
+    `text_pattern_ops` indexes on that expression serve whatever the
+    database collation (a range over `LOWER(x)` is only right under "C").
+    """
+    return queryset.filter(**{f"{field}__istartswith": value})
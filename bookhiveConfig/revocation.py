@@ -0,0 +1,90 @@
+import math
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import caches
+
+
+class TokenRevocationStore:
+    """
+    Keeps the JTIs of revoked refresh tokens in the cache, each with a TTL
+    equal to the token's remaining lifetime, so lookups are a single key
+    check and entries vanish once the token would have expired anyway.
+
+    With `durable` on, revocations are also written to the RevokedToken
+    table so they survive a cache flush or restart. A cache miss is then
+    confirmed with a lookup on its unique index, and the answer is put
+    back in the cache: a revocation until the token expires, a "not
+    revoked" marker for at most `negative_ttl` seconds. `revoke()` drops
+    the marker, so with a shared cache a revocation is seen at once. With
+    a per-process cache, other processes may take up to `negative_ttl`
+    seconds to notice it, rotation still rejects the token since it
+    records the revocation in the table.
+    """
+
+    def __init__(self, alias="default", durable=True, prefix="revoked", negative_ttl=300):
+        self.alias = alias
+        self.durable = durable
+        self.prefix = prefix
+        self.negative_ttl = negative_ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, jti):
+        return f"{self.prefix}:{jti}"
+
+    def valid_key(self, jti):
+        return f"{self.prefix}:valid:{jti}"
+
+    def revoke(self, token):
+        """
+        Revokes a refresh token until it expires. Returns False if it was
+        already revoked, which lets rotation reject a token replayed by
+        concurrent requests.
+        """
+        jti, exp = token["jti"], token["exp"]
+        ttl = math.ceil(exp - time.time())
+        if ttl <= 0:
+            # an expired token can't be used anyway
+            return True
+        added = self.cache.add(self.key(jti), True, timeout=ttl)
+        self.cache.delete(self.valid_key(jti))
+        if self.durable:
+            from users.models import RevokedToken
+            _, created = RevokedToken.objects.get_or_create(
+                jti=jti, defaults={"expires_at": datetime.fromtimestamp(exp, tz=timezone.utc)}
+            )
+            added = added and created
+        return added
+
+    def is_revoked(self, jti, exp=None):
+        """
+        One cache round trip when the answer is cached either way, `exp`
+        (the token's expiry) bounds how long a negative answer is kept.
+        """
+        cached = self.cache.get_many([self.key(jti), self.valid_key(jti)])
+        # a revocation wins over a marker set by a lookup that raced it
+        if cached.get(self.key(jti)):
+            return True
+        if not self.durable or cached.get(self.valid_key(jti)):
+            return False
+        from users.models import RevokedToken
+        revoked = RevokedToken.objects.filter(jti=jti).values_list("expires_at", flat=True).first()
+        if revoked is None:
+            ttl = self.negative_ttl if exp is None else min(self.negative_ttl, math.ceil(exp - time.time()))
+            if ttl > 0:
+                self.cache.set(self.valid_key(jti), True, timeout=ttl)
+            return False
+        ttl = math.ceil(revoked.timestamp() - time.time())
+        if ttl > 0:
+            self.cache.set(self.key(jti), True, timeout=ttl)
+        return True
+
+
+revocation_store = TokenRevocationStore(
+    alias=settings.TOKEN_REVOCATION_CACHE,
+    durable=settings.TOKEN_REVOCATION_DURABLE,
+    negative_ttl=settings.TOKEN_REVOCATION_NEGATIVE_TTL,
+)
@@ -0,0 +1,58 @@
+import threading
+import time
+from contextvars import ContextVar
+from django.conf import settings
+
+
+# the replica the current request reads from, set by ReplicaRoutingMiddleware
+current_replica = ContextVar("current_replica", default=None)
+
+
+class ReplicaHealth:
+    """
+    Remembers replicas that couldn't be reached, so requests skip them for
+    `retry_after` seconds instead of each paying for a failed connection.
+    """
+
+    def __init__(self, retry_after=30):
+        self.retry_after = retry_after
+        self._down_until = {}
+        self._lock = threading.Lock()
+
+    def is_up(self, alias):
+        return self._down_until.get(alias, 0) <= time.monotonic()
+
+    def mark_down(self, alias):
+        with self._lock:
+            self._down_until[alias] = time.monotonic() + self.retry_after
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {alias: until > now for alias, until in self._down_until.items()}
+
+
+replica_health = ReplicaHealth(retry_after=settings.DATABASE_REPLICA_RETRY_SECONDS)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica picked for the current request (GET requests
+    that aren't pinned to the primary), everything else to `default`.
+    """
+
+    def __init__(self, replicas=None):
+        self.replicas = set(settings.DATABASE_REPLICAS if replicas is None else replicas)
+
+    def db_for_read(self, model, **hints):
+        return current_replica.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        return db not in self.replicas
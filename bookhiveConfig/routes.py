@@ -0,0 +1,69 @@
+import re
+from django.urls import URLResolver, get_resolver
+from ninja.security import HttpBearer
+
+
+NAMED_GROUP = re.compile(r"\(\?P<\w+>")
+
+
+def _route_regex(pattern):
+    # the url pattern's regex without its anchor and with its named groups
+    # made anonymous, so many of them can be combined into one pattern
+    source = pattern.pattern.regex.pattern
+    return NAMED_GROUP.sub("(?:", source[1:] if source.startswith("^") else source)
+
+
+def collect_routes(patterns, prefix="/"):
+    """
+    Walks a urlconf in resolver order and yields `(regex, methods)` for
+    every path, `methods` being those whose Ninja operation declares a
+    bearer `auth`, e.g. `auth=BearerAuth()` (empty for public paths).
+    """
+    for pattern in patterns:
+        regex = prefix + _route_regex(pattern)
+        if isinstance(pattern, URLResolver):
+            yield from collect_routes(pattern.url_patterns, regex)
+            continue
+        # Ninja views are bound methods of the PathView holding the operations
+        path_view = getattr(pattern.callback, "__self__", None)
+        methods = frozenset(
+            method
+            for operation in getattr(path_view, "operations", ())
+            if any(isinstance(callback, HttpBearer) for callback in operation.auth_callbacks)
+            for method in operation.methods
+        )
+        yield regex, methods
+
+
+class ProtectedRoutes:
+    """
+    The routes that require a bearer token, built once from the routers'
+    `auth=` declarations so it can't drift from the views. All routes are
+    combined into a single regex with one named group per route, so a
+    lookup is one `match` call whatever the number of routes. Public
+    routes are kept too, in urlconf order, so a path is answered by the
+    route Django would resolve it to (`/books/stats` before
+    `/books/{book_id}`) rather than by a protected pattern it also fits.
+    """
+
+    def __init__(self, routes):
+        methods_by_regex = {}
+        for regex, methods in routes:
+            # Ninja adds one url pattern per operation of the same path
+            methods_by_regex[regex] = methods_by_regex.get(regex, frozenset()) | methods
+        self.routes = list(methods_by_regex.items())
+        protected = any(methods for _, methods in self.routes)
+        self.methods = {f"r{index}": methods for index, (_, methods) in enumerate(self.routes)}
+        self.pattern = re.compile(
+            "|".join(f"(?P<r{index}>{regex})" for index, (regex, _) in enumerate(self.routes))
+        ) if protected else None
+
+    @classmethod
+    def from_urlconf(cls, urlconf=None):
+        return cls(collect_routes(get_resolver(urlconf).url_patterns))
+
+    def is_protected(self, path, method):
+        if self.pattern is None:
+            return False
+        match = self.pattern.match(path)
+        return match is not None and method in self.methods[match.lastgroup]
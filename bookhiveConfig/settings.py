@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 import os, dj_database_url
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,9 +44,11 @@ INSTALLED_APPS = [
     'corsheaders',
     'users',
     'books',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'bookhiveConfig.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -54,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'bookhiveConfig.middleware.AuthMiddleware',
+    'bookhiveConfig.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,10 +86,93 @@ WSGI_APPLICATION = 'bookhiveConfig.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 
+# CONN_MAX_AGE keeps a connection open across requests (seconds, None
+# for unlimited), health checks test it before it's reused. Under ASGI
+# persistent connections aren't reused, use a pool instead.
+DATABASE_CONN_MAX_AGE = config('DATABASE_CONN_MAX_AGE', default=0, cast=lambda v: None if v == 'None' else int(v))
+DATABASE_CONN_HEALTH_CHECKS = config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
 DATABASES = {
-    'default': dj_database_url.parse(config('DATABASE_URL'))
+    'default': dj_database_url.parse(
+        config('DATABASE_URL'),
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+    )
+}
+
+# Read replicas, a comma-separated list of database urls. GET requests
+# read from a replica unless the client wrote something in the last
+# DATABASE_REPLICA_PIN_SECONDS, a replica that can't be reached is skipped
+# for DATABASE_REPLICA_RETRY_SECONDS.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{index}'] = {
+        **dj_database_url.parse(
+            url,
+            conn_max_age=DATABASE_CONN_MAX_AGE,
+            conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+        ),
+        # tests read the replicas' data from the test primary
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['bookhiveConfig.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=5, cast=int)
+DATABASE_REPLICA_RETRY_SECONDS = config('DATABASE_REPLICA_RETRY_SECONDS', default=30, cast=int)
+
+# Deletes hide users and books right away (soft delete), `manage.py
+# purge_deleted` removes the rows later in batches of DELETE_PURGE_BATCH_SIZE.
+# With DATABASE_CASCADE_DELETES (PostgreSQL only) the books' owner foreign
+# key becomes ON DELETE CASCADE, so purging a user deletes their books in
+# the same statement instead of batch by batch.
+DELETE_PURGE_BATCH_SIZE = config('DELETE_PURGE_BATCH_SIZE', default=1000, cast=int)
+DATABASE_CASCADE_DELETES = config('DATABASE_CASCADE_DELETES', default=False, cast=bool)
+
+# Connection pooling (PostgreSQL only), "psycopg" uses psycopg 3's pool
+# (needs psycopg[pool]), "psycopg2" an in-process pool for psycopg2. Pools
+# are per worker process, so the server sees up to workers * max_size
+# connections. Pooled connections are returned at the end of each request
+# rather than kept, so CONN_MAX_AGE is forced to 0.
+DATABASE_POOL = config('DATABASE_POOL', default='off')
+DATABASE_POOL_OPTIONS = {
+    'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+    'max_size': config('DATABASE_POOL_MAX_SIZE', default=10, cast=int),
+    'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=float),
+}
+
+for database in DATABASES.values():
+    if DATABASE_POOL == 'off' or database['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    database['CONN_MAX_AGE'] = 0
+    if DATABASE_POOL == 'psycopg':
+        database.setdefault('OPTIONS', {})['pool'] = DATABASE_POOL_OPTIONS
+    else:
+        database['ENGINE'] = 'bookhiveConfig.db.postgresql'
+        database['POOL'] = DATABASE_POOL_OPTIONS
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# locmem by default, set CACHE_BACKEND to "redis" or "memcached" and
+# CACHE_LOCATION to the server url(s) to share the cache between workers
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[config('CACHE_BACKEND', default='locmem')],
+        'LOCATION': config('CACHE_LOCATION', default='bookhive'),
+        'KEY_PREFIX': 'bookhive',
+    }
+}
+
+# how long (in seconds) serialized single book/user payloads are cached
+DETAIL_CACHE_TIMEOUT = config('DETAIL_CACHE_TIMEOUT', default=300, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -107,6 +193,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+# new passwords are hashed with PASSWORD_HASHER, existing hashes made by
+# any of the others still verify and are rehashed on the next login.
+# "argon2" needs argon2-cffi and "bcrypt" needs bcrypt.
+
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+}
+
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='pbkdf2')
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -147,6 +253,62 @@ SIMPLE_JWT = {
 }
 
 
+# revoked refresh tokens are kept in this cache until they expire, and
+# also in the RevokedToken table when durable (purge_revoked_tokens deletes
+# the expired rows). With a shared redis cache, durability can be turned
+# off so refreshes never query the database. Tokens found not revoked in
+# the table are remembered for TOKEN_REVOCATION_NEGATIVE_TTL seconds, so
+# refreshing a valid token doesn't query it every time either.
+TOKEN_REVOCATION_CACHE = config('TOKEN_REVOCATION_CACHE', default='default')
+TOKEN_REVOCATION_DURABLE = config('TOKEN_REVOCATION_DURABLE', default=True, cast=bool)
+TOKEN_REVOCATION_NEGATIVE_TTL = config('TOKEN_REVOCATION_NEGATIVE_TTL', default=300, cast=int)
+
+
+# Login
+# password hashes are verified on a pool of LOGIN_HASH_WORKERS threads,
+# logins beyond LOGIN_HASH_MAX_PENDING in flight are turned away (503).
+# Before hashing, each client IP and each email must take a token from its
+# bucket: a burst of *_BURST attempts, then *_PER_MINUTE attempts a minute.
+
+LOGIN_HASH_WORKERS = config('LOGIN_HASH_WORKERS', default=os.cpu_count() or 1, cast=int)
+LOGIN_HASH_MAX_PENDING = config('LOGIN_HASH_MAX_PENDING', default=LOGIN_HASH_WORKERS * 8, cast=int)
+LOGIN_THROTTLE_IP_BURST = config('LOGIN_THROTTLE_IP_BURST', default=30, cast=int)
+LOGIN_THROTTLE_IP_PER_MINUTE = config('LOGIN_THROTTLE_IP_PER_MINUTE', default=30, cast=float)
+LOGIN_THROTTLE_EMAIL_BURST = config('LOGIN_THROTTLE_EMAIL_BURST', default=10, cast=int)
+LOGIN_THROTTLE_EMAIL_PER_MINUTE = config('LOGIN_THROTTLE_EMAIL_PER_MINUTE', default=5, cast=float)
+
+
+# User imports
+# bulk user imports validate, hash and insert this many rows at a time,
+# hashing on USER_IMPORT_HASH_WORKERS threads (processes for import_users)
+
+USER_IMPORT_BATCH_SIZE = config('USER_IMPORT_BATCH_SIZE', default=1000, cast=int)
+USER_IMPORT_HASH_WORKERS = config('USER_IMPORT_HASH_WORKERS', default=os.cpu_count() or 1, cast=int)
+
+
+# Background jobs
+# `manage.py run_workers` runs JOB_WORKER_CONCURRENCY jobs at once, looking
+# for new ones every JOB_POLL_INTERVAL seconds. A failed job is retried
+# after JOB_RETRY_BACKOFF seconds, doubled at every attempt, up to
+# JOB_MAX_ATTEMPTS attempts. A running job that hasn't reported progress
+# for JOB_LOCK_TIMEOUT seconds is taken to have lost its worker and is
+# requeued. Uploads handed to jobs wait in JOB_FILES_DIR, which the web
+# and worker processes must share.
+
+JOB_WORKER_CONCURRENCY = config('JOB_WORKER_CONCURRENCY', default=2, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=30, cast=int)
+JOB_LOCK_TIMEOUT = config('JOB_LOCK_TIMEOUT', default=600, cast=int)
+JOB_FILES_DIR = config('JOB_FILES_DIR', default=os.path.join(BASE_DIR, 'var', 'jobs'))
+
+
+# resolved access tokens are cached per worker, up to this many entries
+# for at most this many seconds (or until the token expires)
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=60, cast=int)
+
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 
@@ -155,3 +317,36 @@ CSRF_TRUSTED_ORIGINS = [
     'http://127.0.0.1:8000',
     'https://bookhiveapi.onrender.com'
 ]
+
+
+# Book search
+# leave unset to pick the backend from the database vendor (postgres
+# full-text + pg_trgm, sqlite FTS5), or point it to a custom backend class
+
+BOOK_SEARCH_BACKEND = config('BOOK_SEARCH_BACKEND', default=None)
+
+
+# Book imports
+# how many rows are validated and inserted per bulk_create batch
+
+BOOK_IMPORT_BATCH_SIZE = config('BOOK_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# how many rows the export's database cursor fetches at a time
+BOOK_EXPORT_CHUNK_SIZE = config('BOOK_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# the in-process ISBN filter answers lookups of unknown ISBNs without a
+# query, it's sized for twice the catalogue (at least this many ISBNs)
+BOOK_ISBN_FILTER_CAPACITY = config('BOOK_ISBN_FILTER_CAPACITY', default=10000, cast=int)
+BOOK_ISBN_FILTER_ERROR_RATE = config('BOOK_ISBN_FILTER_ERROR_RATE', default=0.01, cast=float)
+
+# the most operations a single POST /books/batch request may carry
+BOOK_BATCH_MAX_OPERATIONS = config('BOOK_BATCH_MAX_OPERATIONS', default=500, cast=int)
+
+
+# Metrics
+# per-route latency, query and response size metrics, scraped by admins
+# from /api/ops/metrics. A request running more than QUERY_BUDGET queries
+# logs a warning.
+
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+QUERY_BUDGET = config('QUERY_BUDGET', default=20, cast=int)
@@ -0,0 +1,73 @@
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from ninja.throttling import BaseThrottle
+
+
+class TokenBucket:
+    """
+    A token bucket per key, kept in the cache so workers sharing a redis
+    or memcached cache share their buckets. A key can make `capacity`
+    attempts in a burst, then `refill_rate` attempts per second.
+
+    Reads and writes aren't atomic, so concurrent attempts on one key can
+    occasionally be let through together, that's fine for throttling.
+    """
+
+    def __init__(self, prefix, capacity, refill_rate, alias="default"):
+        self.prefix = prefix
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, ident):
+        return f"{self.prefix}:{ident}"
+
+    def _take(self, state, now):
+        # returns the new state, and the seconds to wait when the bucket is empty
+        tokens, updated_at = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+        if tokens < 1:
+            return None, (1 - tokens) / self.refill_rate
+        return (tokens - 1, now), 0
+
+    def _timeout(self):
+        # an untouched bucket is full again after this long, so it can expire
+        return math.ceil(self.capacity / self.refill_rate)
+
+    def consume(self, ident):
+        """Takes a token, returns 0 if allowed or the seconds to wait"""
+        key = self.key(ident)
+        state, wait = self._take(self.cache.get(key), time.time())
+        if state is not None:
+            self.cache.set(key, state, timeout=self._timeout())
+        return wait
+
+    async def aconsume(self, ident):
+        key = self.key(ident)
+        state, wait = self._take(await self.cache.aget(key), time.time())
+        if state is not None:
+            await self.cache.aset(key, state, timeout=self._timeout())
+        return wait
+
+
+def client_ip(request):
+    # honours NINJA_NUM_PROXIES when the app runs behind a proxy
+    return BaseThrottle().get_ident(request)
+
+
+login_ip_throttle = TokenBucket(
+    "login:ip",
+    capacity=settings.LOGIN_THROTTLE_IP_BURST,
+    refill_rate=settings.LOGIN_THROTTLE_IP_PER_MINUTE / 60,
+)
+login_email_throttle = TokenBucket(
+    "login:email",
+    capacity=settings.LOGIN_THROTTLE_EMAIL_BURST,
+    refill_rate=settings.LOGIN_THROTTLE_EMAIL_PER_MINUTE / 60,
+)
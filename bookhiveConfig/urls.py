@@ -18,11 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
+from .ops import api as ops_api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user_mgt/', include('users.urls')),
     path('api/book_mgt/', include('books.urls')),
+    path('api/job_mgt/', include('jobs.urls')),
+    path('api/ops/', ops_api.urls),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,9 +1,21 @@
 import json
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.test import APITestCase, APIClient
 from users.models import CustomUser
+from .revocation import revocation_store
+from .serialization import dumps
+
+
+class FastJsonResponse(JsonResponse):
+    """A JsonResponse that encodes its data with the fast `dumps` encoder"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
 
 
 class CustomResponse:
@@ -16,7 +28,7 @@ class CustomResponse:
             "data": data or [],
             "message": message
         }
-        return JsonResponse(
+        return FastJsonResponse(
             response_data,
             status=status
         )
@@ -28,7 +40,7 @@ class CustomResponse:
             "data": data or [],
             "message": message
         }
-        return JsonResponse(
+        return FastJsonResponse(
             response_data,
             status=status
         )
@@ -47,9 +59,19 @@ def generate_user_token(user):
 # token using the provided refresh token
 def refresh_access_token(refresh_token: str):
     try:
-        # generate a new access token
         refresh = RefreshToken(refresh_token)
+        if revocation_store.is_revoked(refresh["jti"], refresh["exp"]):
+            raise TokenError("Token is blacklisted")
+        # generate a new access token
         access_token = str(refresh.access_token)
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # the old refresh token is revoked and a new one is issued, a
+            # token that was already rotated (e.g. replayed concurrently) fails
+            if api_settings.BLACKLIST_AFTER_ROTATION and not revocation_store.revoke(refresh):
+                raise TokenError("Token is blacklisted")
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
         return {
             "access": access_token,
             "refresh": str(refresh)
@@ -58,6 +80,14 @@ def refresh_access_token(refresh_token: str):
         raise ValueError(f"Token error: {str(e)}")
 
 
+# an utility function used to revoke a refresh token, e.g. on logout
+def revoke_refresh_token(refresh_token: str):
+    try:
+        revocation_store.revoke(RefreshToken(refresh_token))
+    except (InvalidToken, TokenError) as e:
+        raise ValueError(f"Token error: {str(e)}")
+
+
 class AuthSetupTestCase(APITestCase):
     """
     A test case class for handling authentication setup.
@@ -69,6 +99,9 @@ class AuthSetupTestCase(APITestCase):
     """
 
     def authenticate(self):
+        # start from an empty cache, so throttle buckets and cached payloads
+        # don't leak between tests
+        cache.clear()
         self.client = APIClient()
         # create a user 
         self.user = CustomUser.objects.create_user(
@@ -93,4 +126,10 @@ class AuthSetupTestCase(APITestCase):
         self.token = f"Bearer {access_token}"
         self.client.credentials(HTTP_AUTHORIZATION=self.token)
 
+    def set_user_type(self, user_type):
+        # caches are invalidated on commit, which a test case only fakes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_type = user_type
+            self.user.save()
+
 
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        from . import signals
+        from .deletion import install_db_cascade
+        from .search import install_search_backend
+        from .stats import install_book_stats
+        post_migrate.connect(install_search_backend, sender=self)
+        post_migrate.connect(install_book_stats, sender=self)
+        post_migrate.connect(install_db_cascade, sender=self)
@@ -0,0 +1,179 @@
+from django.db import DatabaseError, router, transaction
+from django.utils import timezone
+from pydantic import ValidationError
+from bookhiveConfig.cache import book_cache
+from .importer import format_validation_error
+from .isbn import find_duplicates, isbn_index, normalize_isbn
+from .models import Book
+from .schemas import BookCreateSchema, BookUpdateSchema
+
+
+class BatchError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def can_modify(user, book):
+    # the same rule the single-book update/put/delete handlers apply
+    return not (user.user_type == "user" and book.owner_id != user.id and book.tag == 'admin')
+
+
+class BatchOperation:
+    """One operation of a batch along with its outcome"""
+
+    def __init__(self, index, op, book_id=None, data=None):
+        self.index = index
+        self.op = op
+        self.book_id = book_id
+        self.data = data
+        self.book = None
+        self.fields = ()
+        self.status = None
+        self.error = None
+
+    def fail(self, status, error):
+        self.status, self.error = status, error
+
+    def as_dict(self, serialize):
+        result = {"index": self.index, "op": self.op, "id": self.book.pk if self.book else self.book_id,
+                  "status": self.status}
+        if self.error:
+            result["error"] = self.error
+        elif self.op != "delete":
+            result["data"] = serialize(self.book)
+        return result
+
+
+def prepare(operation, user, books, deleted):
+    """
+    Validates an operation against the books loaded for the batch and
+    applies it to the in-memory instance. Raises BatchError if it can't be.
+    """
+    if operation.op == "create":
+        data = BookCreateSchema(**(operation.data or {}))
+        operation.book = Book(
+            title=data.title,
+            author=data.author,
+            publication_date=data.publication_date,
+            isbn=data.isbn,
+            isbn13=normalize_isbn(data.isbn),
+            tag=data.tag,
+            owner=user if data.tag != 'admin' else None
+        )
+        operation.status = 201
+        return
+
+    if operation.book_id is None:
+        raise BatchError(400, f"An id is required to {operation.op} a book")
+    book = books.get(operation.book_id)
+    if book is None or operation.book_id in deleted:
+        raise BatchError(404, "No Book matches the given query.")
+    if not can_modify(user, book):
+        raise BatchError(403, f"You do not have the permission to {operation.op} this book.")
+
+    operation.book = book
+    if operation.op == "delete":
+        deleted.add(book.pk)
+        operation.status = 204
+        return
+    changes = {attr: value for attr, value in BookUpdateSchema(**(operation.data or {})).dict().items()
+               if value is not None}
+    if "isbn" in changes:
+        changes["isbn13"] = normalize_isbn(changes["isbn"])
+    for attr, value in changes.items():
+        setattr(book, attr, value)
+    operation.fields = tuple(changes)
+    operation.status = 200
+
+
+def write(operations, using):
+    """
+    Writes the prepared operations with one query per kind: a bulk INSERT,
+    a bulk UPDATE and, deletes being soft, an UPDATE ... WHERE id IN.
+    bulk_update neither bumps `auto_now` fields nor sends post_save, so
+    both are done here.
+    """
+    creates = [operation.book for operation in operations if operation.op == "create"]
+    deletes = {operation.book.pk: operation.book for operation in operations if operation.op == "delete"}
+    updates = {operation.book.pk: operation.book for operation in operations
+               if operation.op == "update" and operation.book.pk not in deletes}
+    fields = {field for operation in operations if operation.op == "update" for field in operation.fields}
+
+    if creates:
+        Book.objects.using(using).bulk_create(creates)
+    now = timezone.now()
+    if updates:
+        for book in updates.values():
+            book.date_updated = now
+        Book.objects.using(using).bulk_update(list(updates.values()), [*fields, "date_updated"])
+    if deletes:
+        Book.objects.using(using).filter(id__in=list(deletes)).update(date_deleted=now, date_updated=now)
+    isbn13s = [book.isbn13 for book in creates] + [book.isbn13 for book in updates.values()]
+
+    def committed():
+        isbn_index.add(*isbn13s, using=using)
+        book_cache.invalidate_many([*updates, *deletes], using=using)
+
+    transaction.on_commit(committed, using=using)
+
+
+def write_one(operation, using):
+    # the fallback when a bulk write fails, to find the offending operations
+    if operation.op == "delete":
+        now = timezone.now()
+        Book.objects.using(using).filter(id=operation.book.pk).update(date_deleted=now, date_updated=now)
+        book_cache.invalidate(operation.book.pk, using=using)
+    elif operation.op == "create":
+        operation.book.save(using=using, force_insert=True)
+    else:
+        operation.book.save(using=using, update_fields=[*operation.fields, "date_updated"])
+
+
+def apply_batch(operations, user, atomic=False):
+    """
+    Applies a list of create/update/delete operations in one transaction.
+    All the books the batch targets are loaded (and locked) with a single
+    query. In atomic mode nothing is written unless every operation
+    succeeds, otherwise the valid operations are applied and the rest
+    reported. Returns the operations with their outcome.
+    """
+    using = router.db_for_write(Book)
+    ids = {operation.book_id for operation in operations if operation.op != "create" and operation.book_id}
+    with transaction.atomic(using=using):
+        books = Book.objects.using(using).select_for_update().in_bulk(ids)
+        deleted = set()
+        for operation in operations:
+            try:
+                prepare(operation, user, books, deleted)
+            except ValidationError as e:
+                operation.fail(400, format_validation_error(e))
+            except BatchError as e:
+                operation.fail(e.status, str(e))
+
+        creates = [operation for operation in operations if operation.op == "create" and operation.error is None]
+        for position in find_duplicates([operation.book for operation in creates]):
+            operation = creates[position]
+            operation.fail(409, f"A book with the ISBN {operation.book.isbn} already exists")
+
+        valid = [operation for operation in operations if operation.error is None]
+        if atomic and len(valid) < len(operations):
+            for operation in valid:
+                operation.fail(424, "Not applied, another operation in the atomic batch failed")
+            return operations
+
+        try:
+            with transaction.atomic(using=using):
+                write(valid, using)
+        except DatabaseError as e:
+            if atomic:
+                for operation in valid:
+                    operation.fail(400, str(e))
+                return operations
+            for operation in valid:
+                try:
+                    with transaction.atomic(using=using):
+                        write_one(operation, using)
+                except DatabaseError as e:
+                    operation.fail(400, str(e))
+    return operations
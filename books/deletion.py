@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+from bookhiveConfig.cache import book_cache
+from .models import Book
+
+
+def soft_delete_books(queryset, batch_size=None):
+    """
+    Hides the books of `queryset` with one UPDATE, however many there are,
+    and drops their cached payloads. Returns how many were hidden.
+    """
+    batch_size = batch_size or settings.DELETE_PURGE_BATCH_SIZE
+    now = timezone.now()
+    # the ids are only needed for the cache, a user's whole library is
+    # fetched as plain ints a batch at a time
+    ids = list(queryset.values_list("id", flat=True).iterator(chunk_size=batch_size))
+    hidden = queryset.update(date_deleted=now, date_updated=now)
+    # dropped once the caller's transaction (e.g. soft_delete_user's) commits
+    book_cache.invalidate_many(ids, using=queryset.db, batch_size=batch_size)
+    return hidden
+
+
+def purge_books(queryset, batch_size=None):
+    """
+    Deletes the books of `queryset` (soft-deleted ones, i.e. from
+    `Book.all_objects`) by batches of ids, each batch its own short DELETE
+    so locks and undo stay bounded. Returns how many rows were deleted.
+    """
+    batch_size = batch_size or settings.DELETE_PURGE_BATCH_SIZE
+    using = router.db_for_write(Book)
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        # their payloads were dropped from the cache and their stats
+        # discounted when they were soft-deleted, so the signals a
+        # queryset delete collects rows for have nothing left to do
+        deleted += Book.all_objects.filter(id__in=ids)._raw_delete(using)
+
+
+def db_cascades(using="default"):
+    return settings.DATABASE_CASCADE_DELETES and connections[using].vendor == "postgresql"
+
+
+def install_db_cascade(using="default", **kwargs):
+    """
+    A post_migrate receiver that makes the books' owner foreign key ON
+    DELETE CASCADE when DATABASE_CASCADE_DELETES is on, and plain again
+    when it's off. Only PostgreSQL can alter a constraint in place.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql" or "books_book" not in connection.introspection.table_names():
+        return
+    owner = Book._meta.get_field("owner")
+    action = "ON DELETE CASCADE" if db_cascades(using) else ""
+    with connection.cursor() as cursor:
+        for name, constraint in connection.introspection.get_constraints(cursor, Book._meta.db_table).items():
+            if not constraint["foreign_key"] or constraint["columns"] != [owner.column]:
+                continue
+            cursor.execute("SELECT confdeltype FROM pg_constraint WHERE conname = %s", [name])
+            # 'c' is CASCADE, 'a' the NO ACTION django creates
+            if (cursor.fetchone()[0] == "c") == bool(action):
+                continue
+            cursor.execute(
+                f'ALTER TABLE {Book._meta.db_table} DROP CONSTRAINT "{name}", '
+                f'ADD CONSTRAINT "{name}" FOREIGN KEY ({owner.column}) '
+                f'REFERENCES {owner.related_model._meta.db_table} (id) {action} DEFERRABLE INITIALLY DEFERRED'
+            )
@@ -0,0 +1,102 @@
+import csv
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_FIELDS = ["id", "title", "author", "publication_date", "isbn", "tag", "date_created", "date_updated"]
+
+# the columns of a deleted book's row in an incremental export
+TOMBSTONE_FIELDS = ["id", "date_updated", "deleted"]
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class Echo:
+    # a file-like object that hands back what's written to it, so
+    # csv.writer can produce one line at a time for a streaming response
+    def write(self, value):
+        return value
+
+
+def tombstone(row):
+    # a deleted book is only reported by id, `date_updated` is when it was
+    # deleted so a sync can still advance its watermark past it
+    return {"id": row["id"], "date_updated": row["date_updated"], "deleted": True}
+
+
+class NDJSONFormatter:
+    header = None
+
+    def __init__(self, tombstones=False):
+        self.encoder = DjangoJSONEncoder(separators=(",", ":"))
+        self.tombstones = tombstones
+
+    def format(self, row):
+        if self.tombstones:
+            if row.pop("date_deleted"):
+                row = tombstone(row)
+        return self.encoder.encode(row) + "\n"
+
+
+class CSVFormatter:
+    def __init__(self, tombstones=False):
+        self.writer = csv.writer(Echo())
+        self.tombstones = tombstones
+        # incremental exports get a `deleted` column, empty for live books
+        self.fields = EXPORT_FIELDS + ["deleted"] if tombstones else EXPORT_FIELDS
+        self.header = self.writer.writerow(self.fields)
+
+    def format(self, row):
+        if self.tombstones:
+            row = tombstone(row) if row.pop("date_deleted") else {**row, "deleted": ""}
+        return self.writer.writerow([
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in (row.get(field, "") for field in self.fields)
+        ])
+
+
+FORMATTERS = {
+    "ndjson": NDJSONFormatter,
+    "csv": CSVFormatter,
+}
+
+
+def export_values(queryset, tombstones=False):
+    # tombstones need to tell the deleted rows apart
+    return queryset.values(*EXPORT_FIELDS, "date_deleted") if tombstones else queryset.values(*EXPORT_FIELDS)
+
+
+def export_rows(queryset, chunk_size=None, tombstones=False):
+    """
+    Iterates over the export columns of a queryset through a server-side
+    cursor (on postgres), fetching `chunk_size` rows at a time, without
+    building model instances.
+    """
+    chunk_size = chunk_size or settings.BOOK_EXPORT_CHUNK_SIZE
+    return export_values(queryset, tombstones).iterator(chunk_size=chunk_size)
+
+
+def stream_export(queryset, fmt, chunk_size=None, tombstones=False):
+    """
+    Streams a queryset in `fmt`, a line at a time. With `tombstones` (for
+    incremental exports, the queryset then includes the soft-deleted
+    books), deleted books are written as tombstones.
+    """
+    formatter = FORMATTERS[fmt](tombstones)
+    if formatter.header:
+        yield formatter.header
+    for row in export_rows(queryset, chunk_size, tombstones):
+        yield formatter.format(row)
+
+
+async def astream_export(queryset, fmt, chunk_size=None, tombstones=False):
+    # the async counterpart of stream_export, for ASGI servers
+    formatter = FORMATTERS[fmt](tombstones)
+    if formatter.header:
+        yield formatter.header
+    chunk_size = chunk_size or settings.BOOK_EXPORT_CHUNK_SIZE
+    async for row in export_values(queryset, tombstones).aiterator(chunk_size=chunk_size):
+        yield formatter.format(row)
@@ -0,0 +1,169 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.conf import settings
+from django.db import transaction, DatabaseError
+from pydantic import ValidationError
+from .isbn import find_duplicates, isbn_index, normalize_isbn
+from .models import Book
+from .schemas import BookCreateSchema
+
+
+FORMATS = ("csv", "ndjson")
+REPLACEMENT_CHARACTER = "\ufffd"
+UNDECODABLE = ValueError("the row isn't valid text in the file's encoding")
+
+
+def detect_format(fmt=None, content_type="", filename=""):
+    # the explicit format wins, then the content type, then the file extension
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of: {', '.join(FORMATS)}")
+        return fmt
+    if "csv" in content_type or filename.endswith(".csv"):
+        return "csv"
+    return "ndjson"
+
+
+def iter_rows(lines, fmt):
+    """
+    Lazily parses an iterable of text lines into dicts. A row that can't be
+    parsed is yielded as the exception so it's reported like any invalid row.
+    So is a row with bytes that weren't valid text (`iter_lines` replaces
+    them with U+FFFD) rather than importing the mangled values.
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            # DictReader puts the cells past the header under the None key
+            if None in row:
+                yield ValueError("too many columns")
+                continue
+            if any(REPLACEMENT_CHARACTER in value for value in row.values() if value):
+                yield UNDECODABLE
+                continue
+            # empty cells fall back to the schema defaults
+            yield {key: value for key, value in row.items() if value not in ("", None)}
+        return
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if REPLACEMENT_CHARACTER in line:
+            yield UNDECODABLE
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+def iter_lines(stream, encoding="utf-8"):
+    # decode a binary stream (an uploaded body or an open file) line by
+    # line, invalid bytes are replaced so one bad row doesn't end the import
+    return codecs.iterdecode(stream, encoding, errors="replace")
+
+
+class ImportReport:
+    """
+    Collects the outcome of an import. Only the first `max_errors` errors
+    are kept so memory doesn't grow with the size of a bad file.
+    """
+
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, error):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "error": error})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def build_book(row, owner=None):
+    # validate the row the same way create_book validates its body
+    data = BookCreateSchema(**row)
+    return Book(
+        title=data.title,
+        author=data.author,
+        publication_date=data.publication_date,
+        isbn=data.isbn,
+        isbn13=normalize_isbn(data.isbn),
+        tag=data.tag,
+        owner=owner if data.tag != 'admin' else None
+    )
+
+
+def format_validation_error(error):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+def import_books(rows, owner=None, batch_size=None, report=None):
+    """
+    Validates and inserts books from an iterable of dicts in `bulk_create`
+    batches. Invalid rows are reported and skipped without aborting the
+    load. Only one batch is held in memory at a time.
+    """
+    batch_size = batch_size or settings.BOOK_IMPORT_BATCH_SIZE
+    report = report or ImportReport()
+    numbered_rows = enumerate(rows, start=1)
+
+    while True:
+        chunk = list(islice(numbered_rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for row_number, row in chunk:
+            if isinstance(row, Exception):
+                report.add_error(row_number, f"Invalid row: {row}")
+                continue
+            try:
+                batch.append((row_number, build_book(row, owner)))
+            except ValidationError as e:
+                report.add_error(row_number, format_validation_error(e))
+            except TypeError:
+                report.add_error(row_number, "Invalid row: expected an object")
+        _insert_batch(_drop_duplicates(batch, report), report)
+    return report
+
+
+def _drop_duplicates(batch, report):
+    # books whose owner already has the ISBN, checked against the ISBN
+    # filter first so a fresh catalogue costs no extra query
+    duplicates = find_duplicates([book for _, book in batch])
+    for position in sorted(duplicates):
+        row_number, book = batch[position]
+        report.add_error(row_number, f"Duplicate ISBN: a book with the ISBN {book.isbn} already exists")
+    return [row for position, row in enumerate(batch) if position not in duplicates]
+
+
+def _insert_batch(batch, report):
+    if not batch:
+        return
+    try:
+        with transaction.atomic():
+            Book.objects.bulk_create([book for _, book in batch])
+        report.created += len(batch)
+        isbn_index.add(*(book.isbn13 for _, book in batch))
+    except DatabaseError:
+        # find the offending rows by retrying the batch one row at a time
+        for row_number, book in batch:
+            try:
+                with transaction.atomic():
+                    book.save(force_insert=True)
+                report.created += 1
+            except DatabaseError as e:
+                report.add_error(row_number, str(e))
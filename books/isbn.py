@@ -0,0 +1,171 @@
+import re
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from bookhiveConfig.bloom import BloomFilter
+from .models import Book
+
+
+def isbn13_check_digit(digits):
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits[:12]))
+    return str(-total % 10)
+
+
+def normalize_isbn(value):
+    """
+    Returns the ISBN-13 form of an ISBN-10 or ISBN-13, hyphens and spaces
+    allowed, or None when `value` isn't a valid ISBN.
+    """
+    digits = re.sub(r"[\s-]", "", str(value or "")).upper()
+    if re.fullmatch(r"\d{9}[\dX]", digits):
+        total = sum((10 - i) * (10 if digit == "X" else int(digit)) for i, digit in enumerate(digits))
+        if total % 11:
+            return None
+        digits = f"978{digits[:9]}"
+        return digits + isbn13_check_digit(digits)
+    if re.fullmatch(r"97[89]\d{10}", digits) and isbn13_check_digit(digits) == digits[12]:
+        return digits
+    return None
+
+
+class ISBNIndex:
+    """
+    An in-process Bloom filter over every book's `isbn13`, so lookups of an
+    ISBN we don't have skip the database. It's built on first use and fed
+    by `add()` on writes. Other workers hear about those writes through a
+    version counter in the shared cache, and catch up by reading the books
+    updated since their last sync. They also catch up once the last sync
+    is older than the overlap, in case a bump was lost (e.g. evicted).
+
+    A filter can only rule an ISBN out when every process's writes reach
+    it, i.e. with a shared cache (redis, memcached). With a per-process
+    one (locmem, the default) writes made by other web workers, job
+    workers or management commands go unseen, so the filter isn't built
+    at all: `might_contain()` always answers True and callers check the
+    database.
+    """
+
+    def __init__(self, error_rate=0.01, min_capacity=10000, alias="default", overlap=60):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.alias = alias
+        # catch-ups re-read this many seconds before the last sync, a write
+        # committed after the sync may carry an earlier date_updated
+        self.overlap = timedelta(seconds=overlap)
+        self.key = "books:isbn_index:version"
+        self._filter = None
+        self._version = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        return not isinstance(self.cache, (LocMemCache, DummyCache))
+
+    def _build(self):
+        books = Book.objects.exclude(isbn13=None)
+        bloom = BloomFilter(max(books.count() * 2, self.min_capacity), self.error_rate)
+        synced_at = timezone.now()
+        bloom.update(books.values_list("isbn13", flat=True).iterator())
+        self._synced_at, self._filter = synced_at, bloom
+
+    def _catch_up(self):
+        synced_at = timezone.now()
+        self._filter.update(
+            Book.objects.filter(date_updated__gte=self._synced_at - self.overlap)
+            .exclude(isbn13=None).values_list("isbn13", flat=True)
+        )
+        self._synced_at = synced_at
+
+    def sync(self):
+        version = self.cache.get(self.key)
+        bloom = self._filter
+        if bloom is not None and version == self._version and not bloom.is_full and not self._is_stale():
+            return bloom
+        with self._lock:
+            if self._filter is None or self._filter.is_full:
+                # (re)built at twice the current size
+                self._build()
+            elif version != self._version or self._is_stale():
+                self._catch_up()
+            self._version = version
+            return self._filter
+
+    def _is_stale(self):
+        return timezone.now() - self._synced_at > self.overlap
+
+    def might_contain(self, isbn13):
+        # the filter is never the only source of a negative answer
+        if not self.shared:
+            return True
+        return isbn13 in self.sync()
+
+    async def amight_contain(self, isbn13):
+        # builds and catch-ups go through the sync ORM
+        return await sync_to_async(self.might_contain)(isbn13)
+
+    def add(self, *isbn13s, using="default"):
+        isbn13s = [isbn13 for isbn13 in isbn13s if isbn13]
+        if not isbn13s or not self.shared:
+            return
+        if self._filter is not None:
+            # a rolled back write only leaves a false positive behind
+            self._filter.update(isbn13s)
+        # other workers are told once the rows are visible to them, a
+        # catch-up before the commit would miss them for good
+        transaction.on_commit(self._bump, using=using)
+
+    def _bump(self):
+        self.cache.add(self.key, 0, timeout=None)
+        version = self.cache.incr(self.key)
+        # our own write needs no catch-up unless another worker's came first
+        if self._version == version - 1:
+            self._version = version
+
+
+isbn_index = ISBNIndex(
+    error_rate=settings.BOOK_ISBN_FILTER_ERROR_RATE,
+    min_capacity=settings.BOOK_ISBN_FILTER_CAPACITY
+)
+
+
+def existing_isbns(isbn13s, owner_id):
+    # the ISBNs the owner already has a book for, only the ones the filter
+    # can't rule out are looked up
+    candidates = {isbn13 for isbn13 in isbn13s if isbn13 and isbn_index.might_contain(isbn13)}
+    if not candidates:
+        return set()
+    return set(Book.objects.filter(owner_id=owner_id, isbn13__in=candidates).values_list("isbn13", flat=True))
+
+
+def find_duplicates(books):
+    """
+    Returns the positions in `books` (unsaved instances) of those whose
+    ISBN their owner already has, in the database or earlier in the list.
+    """
+    by_owner = defaultdict(set)
+    for book in books:
+        if book.isbn13:
+            by_owner[book.owner_id].add(book.isbn13)
+    taken = {
+        (owner_id, isbn13) for owner_id, isbn13s in by_owner.items() for isbn13 in existing_isbns(isbn13s, owner_id)
+    }
+    duplicates = set()
+    for position, book in enumerate(books):
+        if not book.isbn13:
+            continue
+        if (book.owner_id, book.isbn13) in taken:
+            duplicates.add(position)
+        taken.add((book.owner_id, book.isbn13))
+    return duplicates
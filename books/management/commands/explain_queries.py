@@ -0,0 +1,71 @@
+import re
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from books.views import filter_books
+from users.views import filter_users
+
+
+TABLES = "books_book|users_customuser"
+
+
+def has_full_scan(plan):
+    # postgres reports sequential scans directly. sqlite reports walking
+    # the rowid as a plain SCAN too, which is only a problem when every
+    # row has to be read to be sorted afterwards
+    if re.search(rf"Seq Scan on ({TABLES})\b", plan):
+        return True
+    return bool(re.search(rf"\bSCAN ({TABLES})$", plan, re.M)) and "USE TEMP B-TREE" in plan
+
+
+def query_shapes():
+    """
+    The query shapes issued by the list endpoints, built through the same
+    helpers the views use so the plans can't drift from the real queries.
+    """
+    size = 10
+    return {
+        "books: default page": filter_books()[:size],
+        "books: cursor page": filter_books().filter(id__lt=1_000_000)[:size + 1],
+        "books: by tag": filter_books(tag="custom")[:size],
+        "books: by isbn": filter_books(isbn="9780000000000")[:size],
+        "books: by owner": filter_books().filter(owner_id=1)[:size],
+        "books: title prefix": filter_books(title="dune")[:size],
+        "books: author prefix": filter_books(author="herbert")[:size],
+        "books: search": filter_books(q="dune")[:size],
+        "books: export since": filter_books().filter(date_updated__gte=datetime(2024, 1, 1, tzinfo=timezone.utc)).order_by("date_updated", "id"),
+        "users: default page": filter_users()[:size],
+        "users: email contains": filter_users(email="john")[:size],
+        "users: first name contains": filter_users(first_name="john")[:size],
+        "users: last name contains": filter_users(last_name="doe")[:size],
+    }
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on every list-endpoint query shape and flags full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail-on-scan", action="store_true",
+            help="Exit with an error if any query shape plans a full table scan."
+        )
+        parser.add_argument(
+            "--analyze", action="store_true",
+            help="Run EXPLAIN ANALYZE (postgres only), this executes the queries."
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {"analyze": True} if options["analyze"] and connection.vendor == "postgresql" else {}
+        regressions = []
+        for name, queryset in query_shapes().items():
+            plan = queryset.explain(**explain_options)
+            full_scan = has_full_scan(plan)
+            if full_scan:
+                regressions.append(name)
+            style = self.style.WARNING if full_scan else self.style.SUCCESS
+            self.stdout.write(style(f"== {name}"))
+            self.stdout.write(plan + "\n")
+
+        if regressions and options["fail_on_scan"]:
+            raise CommandError("Full table scans planned for: " + ", ".join(regressions))
+        self.stdout.write(f"{len(regressions)} query shape(s) with full table scans.")
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from books.importer import FORMATS, ImportReport, detect_format, import_books, iter_lines, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Streams books from a CSV or NDJSON file into the database in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The CSV or NDJSON file to import.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=settings.BOOK_IMPORT_BATCH_SIZE)
+        parser.add_argument("--owner", help="Email of the user that owns the non-admin books.")
+        parser.add_argument("--max-errors", type=int, default=100, help="How many row errors to print.")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = get_user_model().objects.filter(email=options["owner"].lower()).first()
+            if owner is None:
+                raise CommandError(f"No user with the email {options['owner']}")
+
+        fmt = detect_format(options["format"], filename=options["path"])
+        report = ImportReport(max_errors=options["max_errors"])
+        try:
+            with open(options["path"], "rb") as stream:
+                import_books(
+                    iter_rows(iter_lines(stream), fmt),
+                    owner=owner,
+                    batch_size=options["batch_size"],
+                    report=report
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f"{report.created} book(s) imported, {report.failed} row(s) failed."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from books.stats import get_stats_backend, rebuild_book_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the book stats summary table from scratch and (re)installs the triggers that maintain it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        connection = connections[using]
+        get_stats_backend(connection).install(connection)
+        rows = rebuild_book_stats(using)
+        self.stdout.write(self.style.SUCCESS(f"{rows} book stat row(s) rebuilt."))
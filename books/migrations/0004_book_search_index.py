@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# the DDL as it stood when this migration was written, so what it creates
+# doesn't depend on the current books.search code or BOOK_SEARCH_BACKEND.
+# Per vendor, the statements to run forwards and backwards
+SEARCH_SQL = {
+    'postgresql': (
+        [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX IF NOT EXISTS books_book_search_tsv ON books_book USING GIN "
+            "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, '')))",
+            "CREATE INDEX IF NOT EXISTS books_book_title_trgm ON books_book USING GIN (title gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS books_book_author_trgm ON books_book USING GIN (author gin_trgm_ops)",
+        ],
+        [
+            "DROP INDEX IF EXISTS books_book_search_tsv",
+            "DROP INDEX IF EXISTS books_book_title_trgm",
+            "DROP INDEX IF EXISTS books_book_author_trgm",
+        ],
+    ),
+    'sqlite': (
+        [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS books_book_fts USING fts5"
+            "(title, author, content='books_book', content_rowid='id')",
+            "CREATE TRIGGER IF NOT EXISTS books_book_fts_ai AFTER INSERT ON books_book BEGIN "
+            "INSERT INTO books_book_fts(rowid, title, author) VALUES (new.id, new.title, new.author); END",
+            "CREATE TRIGGER IF NOT EXISTS books_book_fts_ad AFTER DELETE ON books_book BEGIN "
+            "INSERT INTO books_book_fts(books_book_fts, rowid, title, author) "
+            "VALUES ('delete', old.id, old.title, old.author); END",
+            "CREATE TRIGGER IF NOT EXISTS books_book_fts_au AFTER UPDATE OF title, author ON books_book BEGIN "
+            "INSERT INTO books_book_fts(books_book_fts, rowid, title, author) "
+            "VALUES ('delete', old.id, old.title, old.author); "
+            "INSERT INTO books_book_fts(rowid, title, author) VALUES (new.id, new.title, new.author); END",
+            # index the books that are already there
+            "INSERT INTO books_book_fts(books_book_fts) VALUES ('rebuild')",
+        ],
+        [
+            "DROP TRIGGER IF EXISTS books_book_fts_ai",
+            "DROP TRIGGER IF EXISTS books_book_fts_ad",
+            "DROP TRIGGER IF EXISTS books_book_fts_au",
+            "DROP TABLE IF EXISTS books_book_fts",
+        ],
+    ),
+}
+
+
+def install(apps, schema_editor):
+    forwards, _ = SEARCH_SQL.get(schema_editor.connection.vendor, ([], []))
+    for sql in forwards:
+        schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    _, backwards = SEARCH_SQL.get(schema_editor.connection.vendor, ([], []))
+    for sql in backwards:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # creates the full-text/trigram indexes (postgres) or the FTS5 shadow
+    # table (sqlite) that back the `q` search parameter
+    atomic = False
+
+    dependencies = [
+        ('books', '0003_alter_book_isbn'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=16)),
+                ('key', models.CharField(max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key'), name='bookstat_dimension_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1 on 2026-10-18 19:26
+
+import re
+from django.conf import settings
+from django.db import migrations, models
+
+
+# a copy of books.isbn.normalize_isbn as it was when this migration was
+# written, so later changes to the app code don't change what it does
+def isbn13_check_digit(digits):
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits[:12]))
+    return str(-total % 10)
+
+
+def normalize_isbn(value):
+    digits = re.sub(r"[\s-]", "", str(value or "")).upper()
+    if re.fullmatch(r"\d{9}[\dX]", digits):
+        total = sum((10 - i) * (10 if digit == "X" else int(digit)) for i, digit in enumerate(digits))
+        if total % 11:
+            return None
+        digits = f"978{digits[:9]}"
+        return digits + isbn13_check_digit(digits)
+    if re.fullmatch(r"97[89]\d{10}", digits) and isbn13_check_digit(digits) == digits[12]:
+        return digits
+    return None
+
+
+def backfill_isbn13(apps, schema_editor):
+    books = apps.get_model('books', 'Book').objects.using(schema_editor.connection.alias)
+    batch = []
+    for book in books.only('id', 'isbn').iterator(chunk_size=2000):
+        book.isbn13 = normalize_isbn(book.isbn)
+        if book.isbn13:
+            batch.append(book)
+        if len(batch) >= 2000:
+            books.bulk_update(batch, ['isbn13'])
+            batch = []
+    books.bulk_update(batch, ['isbn13'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_bookstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn13'], name='book_isbn13_idx'),
+        ),
+        migrations.RunPython(backfill_isbn13, migrations.RunPython.noop),
+    ]
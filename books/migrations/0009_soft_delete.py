@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 19:34
+
+import books.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_book_isbn13'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='date_deleted',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=books.models.cascade_in_database, related_name='books', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('date_deleted__isnull', False)), fields=['date_deleted'], name='book_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1 on 2026-10-18 19:58
+
+from django.db import migrations
+
+# istartswith compiles to UPPER(col::text) LIKE UPPER('v%') on postgres, an
+# index on that expression with text_pattern_ops serves it whatever the
+# database collation. Other backends don't plan such a LIKE on an index
+PATTERN_INDEXES = {
+    'book_title_upper_like_idx': 'title',
+    'book_author_upper_like_idx': 'author',
+}
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in PATTERN_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "books_book" (UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PATTERN_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_title_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_author_lower_idx',
+        ),
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
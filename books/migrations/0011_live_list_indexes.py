@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-18 20:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_prefix_pattern_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_tag_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_owner_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('date_deleted', None)), fields=['tag', '-id'], name='book_tag_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('date_deleted', None)), fields=['owner', '-id'], name='book_owner_id_idx'),
+        ),
+    ]
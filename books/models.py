@@ -1,19 +1,81 @@
-from django.db import models
+from django.conf import settings
+from django.db import connections, models
+from django.db.models import Q
 from users.models import CustomUser
 
+
+def cascade_in_database(collector, field, sub_objs, using):
+    # with DATABASE_CASCADE_DELETES, PostgreSQL's foreign key itself is ON
+    # DELETE CASCADE (books/deletion.py), so deleting an owner doesn't load
+    # all their books into memory first, otherwise this is CASCADE
+    if settings.DATABASE_CASCADE_DELETES and connections[using].vendor == "postgresql":
+        return
+    models.CASCADE(collector, field, sub_objs, using)
+
+
+# lets the collector call it without evaluating the related books
+cascade_in_database.lazy_sub_objs = True
+
+
+class BookManager(models.Manager):
+    # soft-deleted books are hidden everywhere, `Book.all_objects` has them
+    def get_queryset(self):
+        return super().get_queryset().filter(date_deleted=None)
+
+
 class Book(models.Model):
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255)
     publication_date = models.DateField()
     isbn = models.CharField(max_length=25)
-    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='books')
+    # `isbn` normalized to ISBN-13 (books/isbn.py), null when it isn't a valid ISBN
+    isbn13 = models.CharField(max_length=13, null=True, blank=True, editable=False)
+    owner = models.ForeignKey(CustomUser, on_delete=cascade_in_database, null=True, blank=True, related_name='books')
     # it can be admin/custom..if it's admin, then the owner would be null
     # else, if it's custom the owner would be populated..just basically to 
     # know which books were uploaded by the admins(or superusers)/normal users
     tag = models.CharField(max_length=6, default="admin")
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
+    # set when the book (or its owner) is soft-deleted, purge_deleted
+    # removes the row later
+    date_deleted = models.DateTimeField(null=True, blank=True)
+
+    objects = BookManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # the list endpoints always order by -id, so every filter
+        # column is paired with it to avoid a sort step. They only list
+        # live books, so only those are indexed, matching the
+        # `date_deleted IS NULL` the default manager adds
+        indexes = [
+            models.Index(fields=['tag', '-id'], condition=Q(date_deleted=None), name='book_tag_id_idx'),
+            models.Index(fields=['owner', '-id'], condition=Q(date_deleted=None), name='book_owner_id_idx'),
+            models.Index(fields=['isbn'], name='book_isbn_idx'),
+            models.Index(fields=['isbn13'], name='book_isbn13_idx'),
+            models.Index(fields=['date_updated', 'id'], name='book_updated_id_idx'),
+            # the title/author prefix filters are served by postgres-only
+            # text_pattern_ops indexes, see migration 0010
+            # only the rows waiting for the purge are indexed
+            models.Index(fields=['date_deleted'], condition=Q(date_deleted__isnull=False), name='book_deleted_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+
+class BookStat(models.Model):
+    # the number of books per (dimension, key), e.g. ("tag", "admin") or
+    # ("year", "2024"), kept up to date by database triggers (books/stats.py)
+    dimension = models.CharField(max_length=16)
+    key = models.CharField(max_length=255)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='bookstat_dimension_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.key}: {self.count}"
@@ -0,0 +1,26 @@
+from bookhiveConfig.pagination import apaginate_by_cursor, apaginate_by_page
+from bookhiveConfig.serialization import schema_fields, serialize_rows
+from .schemas import DATETIME_FIELDS, BookResponseSchema
+from .stats import aowner_book_count
+
+
+async def aowner_books(queryset, owner_id, page=1, size=10, pagination="cursor", after=None, before=None,
+                       include_total=True):
+    """
+    A page of one owner's books, newest first. Both modes are served by the
+    (owner_id, -id) index, and the total is read from the owner's BookStat
+    counter rather than a COUNT(*), so pages of a 50k book library cost the
+    same as pages of a small one. Cursor mode is the default for that
+    reason, deep OFFSETs don't have that property.
+    """
+    queryset = queryset.order_by('-id').values(*schema_fields(BookResponseSchema))
+    count = await aowner_book_count(owner_id) if include_total else None
+    if pagination == "cursor" or after or before:
+        rows, meta = await apaginate_by_cursor(
+            queryset, size, after=after, before=before, include_total=include_total, count=count
+        )
+    else:
+        rows, meta = await apaginate_by_page(queryset, page, size, include_total=include_total, count=count)
+    if "total" in meta:
+        meta["total_books"] = meta.pop("total")
+    return {"books": serialize_rows(BookResponseSchema, rows, DATETIME_FIELDS), **meta}
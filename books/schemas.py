@@ -1,7 +1,11 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import date
 
+
+# datetime columns that responses expose as ISO strings
+DATETIME_FIELDS = ("date_created", "date_updated")
+
 class BookCreateSchema(BaseModel):
     title: str
     author: str
@@ -28,3 +32,14 @@ class BookResponseSchema(BaseModel):
     date_created: str
     date_updated: str
 
+
+
+class BookBatchOperationSchema(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: Optional[dict] = None
+
+
+class BookBatchSchema(BaseModel):
+    operations: List[BookBatchOperationSchema]
+    atomic: bool = False
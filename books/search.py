@@ -0,0 +1,182 @@
+import re
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+class BaseSearchBackend:
+    """
+    A search backend filters a Book queryset down to the rows matching a
+    free-text query and annotates each row with a `search_rank`, where a
+    higher rank means a more relevant match.
+    """
+
+    vendor = None
+
+    def install(self, connection):
+        # create whatever indexes/shadow tables the backend relies on,
+        # this must be idempotent since it runs after every migrate
+        pass
+
+    def uninstall(self, connection):
+        pass
+
+    def search(self, queryset, q):
+        raise NotImplementedError
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """A fallback for databases without a full-text engine, it does not rank"""
+
+    def search(self, queryset, q):
+        return queryset.filter(
+            Q(title__icontains=q) | Q(author__icontains=q)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Uses a GIN index over a `tsvector` of the title and author for word
+    matches, and `pg_trgm` GIN indexes for fuzzy/substring matches. The
+    rank combines `ts_rank` with the best trigram similarity.
+    """
+
+    vendor = "postgresql"
+    # this expression must match the indexed one exactly for the planner to use it
+    VECTOR = "to_tsvector('simple', coalesce(books_book.title, '') || ' ' || coalesce(books_book.author, ''))"
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS books_book_search_tsv ON books_book USING GIN "
+                "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, '')))"
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS books_book_title_trgm ON books_book USING GIN (title gin_trgm_ops)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS books_book_author_trgm ON books_book USING GIN (author gin_trgm_ops)")
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS books_book_search_tsv")
+            cursor.execute("DROP INDEX IF EXISTS books_book_title_trgm")
+            cursor.execute("DROP INDEX IF EXISTS books_book_author_trgm")
+
+    def search(self, queryset, q):
+        match = RawSQL(
+            f"({self.VECTOR} @@ websearch_to_tsquery('simple', %s)"
+            " OR books_book.title %% %s OR books_book.author %% %s)",
+            [q, q, q],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"ts_rank({self.VECTOR}, websearch_to_tsquery('simple', %s))"
+            " + greatest(similarity(books_book.title, %s), similarity(books_book.author, %s))",
+            [q, q, q],
+            output_field=FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank)
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Keeps an FTS5 shadow table in sync with `books_book` through triggers
+    and ranks matches with bm25, weighting the title above the author.
+    """
+
+    vendor = "sqlite"
+    TABLE = "books_book_fts"
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = '{self.TABLE}'"
+            )
+            created = not cursor.fetchone()[0]
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5"
+                "(title, author, content='books_book', content_rowid='id')"
+            )
+            # triggers are dropped whenever sqlite rebuilds books_book during
+            # a migration, so they're (re)created here unconditionally
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.TABLE}_ai AFTER INSERT ON books_book BEGIN "
+                f"INSERT INTO {self.TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.TABLE}_ad AFTER DELETE ON books_book BEGIN "
+                f"INSERT INTO {self.TABLE}({self.TABLE}, rowid, title, author) "
+                "VALUES ('delete', old.id, old.title, old.author); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.TABLE}_au AFTER UPDATE OF title, author ON books_book BEGIN "
+                f"INSERT INTO {self.TABLE}({self.TABLE}, rowid, title, author) "
+                "VALUES ('delete', old.id, old.title, old.author); "
+                f"INSERT INTO {self.TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author); END"
+            )
+            if created:
+                cursor.execute(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('rebuild')")
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {self.TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.TABLE}")
+
+    @staticmethod
+    def to_match_expression(q):
+        # quote every term so user input can't inject FTS5 syntax, and
+        # prefix-match the terms so partial words still find results
+        terms = re.findall(r"\w+", q)
+        return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    def search(self, queryset, q):
+        expression = self.to_match_expression(q)
+        if not expression:
+            return queryset.none()
+        match = RawSQL(
+            f"books_book.id IN (SELECT rowid FROM {self.TABLE} WHERE {self.TABLE} MATCH %s)",
+            [expression],
+            output_field=BooleanField(),
+        )
+        # bm25 scores are negative, the lower the better
+        rank = RawSQL(
+            f"(SELECT -bm25({self.TABLE}, 10.0, 5.0) FROM {self.TABLE} "
+            f"WHERE {self.TABLE} MATCH %s AND rowid = books_book.id)",
+            [expression],
+            output_field=FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank)
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in (PostgresSearchBackend, SQLiteSearchBackend)
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Returns the backend configured in `BOOK_SEARCH_BACKEND`, or picks one
+    based on the database vendor.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "BOOK_SEARCH_BACKEND", None)
+        backend_class = import_string(path) if path else BACKENDS.get(connection.vendor, BasicSearchBackend)
+        _backend = backend_class()
+    return _backend
+
+
+def search_books(queryset, q):
+    # rank the results, newest first among equally relevant books
+    return get_search_backend().search(queryset, q).order_by("-search_rank", "-id")
+
+
+def install_search_backend(using="default", **kwargs):
+    # a post_migrate receiver, the backend install is idempotent
+    db = connections[using]
+    if "books_book" in db.introspection.table_names():
+        get_search_backend().install(db)
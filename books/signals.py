@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from bookhiveConfig.cache import book_cache
+from .isbn import isbn_index, normalize_isbn
+from .models import Book
+
+
+@receiver(pre_save, sender=Book)
+def set_isbn13(sender, instance, **kwargs):
+    # bulk_create, bulk_update and queryset.update() skip this, their
+    # callers set isbn13 themselves
+    instance.isbn13 = normalize_isbn(instance.isbn)
+
+
+@receiver(post_save, sender=Book)
+def index_isbn(sender, instance, **kwargs):
+    isbn_index.add(instance.isbn13)
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    # drop the cached payload so the next read rebuilds it, once committed
+    book_cache.invalidate(instance.pk, using=kwargs.get("using"))
@@ -0,0 +1,239 @@
+from django.db import connections, transaction
+from django.db.models import CharField, Count, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, ExtractYear
+from .models import Book, BookStat
+
+
+DIMENSIONS = ("tag", "owner", "year", "author")
+TABLE = BookStat._meta.db_table
+
+# per vendor, the key expression of each dimension, `{row}` being the
+# row reference (a table, or the NEW/OLD row of a trigger). The triggers
+# and `rebuild_book_stats` both use these, so they agree on every key.
+KEYS = {
+    "postgresql": {
+        "tag": "{row}tag",
+        "owner": "coalesce({row}owner_id::text, 'none')",
+        "year": "extract(year from {row}publication_date)::int::text",
+        "author": "{row}author",
+    },
+    "sqlite": {
+        "tag": "{row}tag",
+        "owner": "coalesce(CAST({row}owner_id AS TEXT), 'none')",
+        # strftime zero-pads years before 1000, postgres doesn't
+        "year": "CAST(CAST(strftime('%Y', {row}publication_date) AS INTEGER) AS TEXT)",
+        "author": "{row}author",
+    },
+}
+
+
+def changes_sql(vendor, sources):
+    """
+    A SELECT of (dimension, key, count) summing the rows of `sources`, a
+    list of (row reference, FROM clause, sign), so a write that moves a
+    book between keys nets out to one row per key. Soft-deleted books
+    don't count.
+    """
+    selects = [
+        f"SELECT '{dimension}' AS dimension, {KEYS[vendor][dimension].format(row=row)} AS key, {sign} AS delta{source}"
+        f" WHERE {row}date_deleted IS NULL"
+        for row, source, sign in sources for dimension in DIMENSIONS
+    ]
+    return (
+        f"SELECT dimension, key, sum(delta) FROM ({' UNION ALL '.join(selects)}) AS changes "
+        "WHERE true GROUP BY dimension, key HAVING sum(delta) <> 0"
+    )
+
+
+def upsert_sql(vendor, sources):
+    return (
+        f"INSERT INTO {TABLE} (dimension, key, count) {changes_sql(vendor, sources)} "
+        f"ON CONFLICT (dimension, key) DO UPDATE SET count = {TABLE}.count + excluded.count"
+    )
+
+
+class BaseStatsBackend:
+    """
+    Keeps `BookStat` in step with `books_book` inside the database, so bulk
+    inserts, queryset updates and raw deletes are all counted, which model
+    signals would miss.
+    """
+
+    vendor = None
+    # bumped whenever the triggers count differently, so installs replace
+    # the older ones and rebuild the counts
+    VERSION = 3
+
+    def install(self, connection):
+        # returns whether the triggers were missing or outdated, i.e. the
+        # counts can't be trusted and need a rebuild
+        return False
+
+    def uninstall(self, connection):
+        pass
+
+    def lock(self, connection):
+        # hold off writers while the counts are recomputed
+        pass
+
+
+class PostgresStatsBackend(BaseStatsBackend):
+    """
+    Statement level triggers over transition tables: a bulk INSERT of a
+    thousand books is one upsert of a few rows, not a thousand.
+    """
+
+    vendor = "postgresql"
+    FUNCTION = "books_bookstat_sync"
+    EVENTS = {"ai": "INSERT", "au": "UPDATE", "ad": "DELETE"}
+
+    def install(self, connection):
+        new = ("", " FROM new_rows", 1)
+        old = ("", " FROM old_rows", -1)
+        names = {suffix: f"{self.FUNCTION}_v{self.VERSION}_{suffix}" for suffix in self.EVENTS}
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tgname FROM pg_trigger WHERE tgname LIKE %s", [f"{self.FUNCTION}_%"])
+            existing = {row[0] for row in cursor.fetchall()}
+            for name in existing - set(names.values()):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON books_book")
+            cursor.execute(
+                f"CREATE OR REPLACE FUNCTION {self.FUNCTION}() RETURNS trigger AS $$ BEGIN "
+                f"IF TG_OP = 'INSERT' THEN {upsert_sql(self.vendor, [new])}; "
+                f"ELSIF TG_OP = 'DELETE' THEN {upsert_sql(self.vendor, [old])}; "
+                f"ELSE {upsert_sql(self.vendor, [new, old])}; "
+                "END IF; RETURN NULL; END $$ LANGUAGE plpgsql"
+            )
+            for suffix, event in self.EVENTS.items():
+                # transition tables need one trigger per event
+                tables = {
+                    "INSERT": "NEW TABLE AS new_rows",
+                    "UPDATE": "NEW TABLE AS new_rows OLD TABLE AS old_rows",
+                    "DELETE": "OLD TABLE AS old_rows",
+                }[event]
+                cursor.execute(f"DROP TRIGGER IF EXISTS {names[suffix]} ON books_book")
+                cursor.execute(
+                    f"CREATE TRIGGER {names[suffix]} AFTER {event} ON books_book "
+                    f"REFERENCING {tables} FOR EACH STATEMENT EXECUTE FUNCTION {self.FUNCTION}()"
+                )
+        return existing != set(names.values())
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tgname FROM pg_trigger WHERE tgname LIKE %s", [f"{self.FUNCTION}_%"])
+            for (name,) in cursor.fetchall():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON books_book")
+            cursor.execute(f"DROP FUNCTION IF EXISTS {self.FUNCTION}()")
+
+    def lock(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE books_book IN SHARE MODE")
+
+
+class SQLiteStatsBackend(BaseStatsBackend):
+    """Row level triggers, SQLite has no statement level ones"""
+
+    vendor = "sqlite"
+    PREFIX = "books_bookstat"
+
+    def install(self, connection):
+        new = ("new.", "", 1)
+        old = ("old.", "", -1)
+        triggers = {
+            f"{self.PREFIX}_v{self.VERSION}_ai": ("AFTER INSERT", [new]),
+            f"{self.PREFIX}_v{self.VERSION}_ad": ("AFTER DELETE", [old]),
+            f"{self.PREFIX}_v{self.VERSION}_au": (
+                "AFTER UPDATE OF tag, owner_id, publication_date, author, date_deleted", [new, old]
+            ),
+        }
+        with connection.cursor() as cursor:
+            existing = self.installed(cursor)
+            for name in existing - set(triggers):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            # like the search triggers, these are dropped whenever sqlite
+            # rebuilds books_book during a migration
+            for name, (event, sources) in triggers.items():
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {name} {event} ON books_book BEGIN "
+                    f"{upsert_sql(self.vendor, sources)}; END"
+                )
+        return existing != set(triggers)
+
+    def installed(self, cursor):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f"{self.PREFIX}_%"])
+        return {row[0] for row in cursor.fetchall()}
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for name in self.installed(cursor):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in (PostgresStatsBackend, SQLiteStatsBackend)
+}
+
+
+def get_stats_backend(connection):
+    return BACKENDS.get(connection.vendor, BaseStatsBackend)()
+
+
+def rebuild_book_stats(using="default"):
+    """
+    Recomputes every count from `books_book` in one transaction with a
+    GROUP BY per dimension, returns the number of (dimension, key) rows.
+    """
+    connection = connections[using]
+    books = Book.objects.using(using)
+    if connection.vendor in KEYS:
+        # the very expressions the triggers use
+        row = f"{connection.ops.quote_name(Book._meta.db_table)}."
+        groups = {
+            dimension: books.values_list(RawSQL(expression.format(row=row), ()))
+            for dimension, expression in KEYS[connection.vendor].items()
+        }
+    else:
+        # no triggers to agree with
+        groups = {
+            "tag": books.values_list("tag"),
+            "owner": books.values_list(Coalesce(Cast("owner_id", CharField()), Value("none"))),
+            "year": books.values_list(Cast(ExtractYear("publication_date"), CharField())),
+            "author": books.values_list("author"),
+        }
+    with transaction.atomic(using=using):
+        get_stats_backend(connection).lock(connection)
+        BookStat.objects.using(using).all().delete()
+        stats = BookStat.objects.using(using).bulk_create(
+            BookStat(dimension=dimension, key=key, count=count)
+            for dimension, queryset in groups.items()
+            for key, count in queryset.annotate(count=Count("id")).order_by()
+        )
+    return len(stats)
+
+
+async def abook_stats(dimension=None):
+    # {dimension: {key: count}}, the largest groups first
+    if dimension and dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}', expected one of: {', '.join(DIMENSIONS)}")
+    queryset = BookStat.objects.filter(count__gt=0).order_by("dimension", "-count", "key")
+    if dimension:
+        queryset = queryset.filter(dimension=dimension)
+    stats = {name: {} for name in ([dimension] if dimension else DIMENSIONS)}
+    async for name, key, count in queryset.values_list("dimension", "key", "count"):
+        stats[name][key] = count
+    return stats
+
+
+async def aowner_book_count(owner_id):
+    # one indexed row whatever the size of the owner's library
+    count = await BookStat.objects.filter(dimension="owner", key=str(owner_id)).values_list("count", flat=True).afirst()
+    return count or 0
+
+
+def install_book_stats(using="default", **kwargs):
+    # a post_migrate receiver, the counts are rebuilt when the triggers
+    # were missing since writes made without them weren't counted
+    db = connections[using]
+    tables = db.introspection.table_names()
+    if "books_book" in tables and TABLE in tables and get_stats_backend(db).install(db):
+        rebuild_book_stats(using)
@@ -0,0 +1,26 @@
+import os
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from jobs.queue import task, track_progress
+from .importer import import_books, iter_lines, iter_rows
+from .stats import rebuild_book_stats
+
+
+@task("books.import", max_attempts=1)
+def import_books_job(job, path, format, owner_id=None, batch_size=None):
+    # not retried, a second run would report the rows the first one
+    # inserted as duplicates. Progress counts the rows read so far
+    try:
+        owner = get_user_model().objects.get(id=owner_id) if owner_id else None
+        with open(path, "rb") as stream:
+            rows = track_progress(
+                job, iter_rows(iter_lines(stream), format), every=batch_size or settings.BOOK_IMPORT_BATCH_SIZE
+            )
+            return import_books(rows, owner=owner, batch_size=batch_size).as_dict()
+    finally:
+        os.remove(path)
+
+
+@task("books.rebuild_stats")
+def rebuild_book_stats_job(job):
+    return {"rows": rebuild_book_stats()}
@@ -1,5 +1,22 @@
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from bookhiveConfig.middleware import ReplicaRoutingMiddleware
+from bookhiveConfig.routers import ReplicaRouter, current_replica, replica_health
+from bookhiveConfig.db.pool import ConnectionPool, PoolTimeout
 from bookhiveConfig.utils import AuthSetupTestCase
-from .models import Book
+from bookhiveConfig.cache import ReadThroughCache, book_cache, stats as cache_stats
+from bookhiveConfig.metrics import registry as metrics_registry, query_budget_exceeded
+from .isbn import ISBNIndex, isbn_index, normalize_isbn
+from .models import Book, BookStat
 
 
 class BookTests(AuthSetupTestCase):
@@ -25,6 +42,55 @@ class BookTests(AuthSetupTestCase):
         response = self.client.get('/api/book_mgt/books')
         self.assertEqual(response.status_code, 200)
 
+    def test_book_list_matches_detail(self):
+        # the batched list serialization must produce the same payload as return_book_data
+        response = self.client.get('/api/book_mgt/books')
+        listed = response.json().get('data').get('books')[0]
+        detail = self.client.get(f'/api/book_mgt/books/{self.book_id}').json().get('data')
+        self.assertEqual(listed, detail)
+
+    def test_book_list_cursor(self):
+        for i in range(3):
+            Book.objects.create(**{**self.book_data, "title": f"Book {i}"})
+        response = self.client.get('/api/book_mgt/books?pagination=cursor&size=2&include_total=false')
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual(len(data.get('books')), 2)
+        self.assertNotIn('total_books', data)
+        self.assertIsNone(data.get('prev_cursor'))
+
+        response = self.client.get(f"/api/book_mgt/books?size=2&after={data.get('next_cursor')}")
+        data = response.json().get('data')
+        self.assertEqual([book['id'] for book in data.get('books')], [self.book_id + 1, self.book_id])
+        self.assertIsNone(data.get('next_cursor'))
+        self.assertIsNotNone(data.get('prev_cursor'))
+
+    def test_book_search(self):
+        Book.objects.create(**{**self.book_data, "title": "Dune", "author": "Frank Herbert"})
+        Book.objects.create(**{**self.book_data, "title": "Children of Dune", "author": "Frank Herbert"})
+        Book.objects.create(**{**self.book_data, "title": "Emma", "author": "Jane Austen"})
+        response = self.client.get('/api/book_mgt/books?q=dune')
+        self.assertEqual(response.status_code, 200)
+        titles = [book['title'] for book in response.json().get('data').get('books')]
+        self.assertEqual(sorted(titles), ["Children of Dune", "Dune"])
+
+        response = self.client.get('/api/book_mgt/books?title=dun')
+        titles = [book['title'] for book in response.json().get('data').get('books')]
+        self.assertEqual(titles, ["Dune"])
+
+    def test_book_title_prefix(self):
+        Book.objects.create(**{**self.book_data, "title": "Ab-Ovo"})
+        Book.objects.create(**{**self.book_data, "title": "Élan Vital"})
+        Book.objects.create(**{**self.book_data, "title": "Abacus"})
+        for prefix, expected in (("ab-", ["Ab-Ovo"]), ("AB", ["Abacus", "Ab-Ovo"]), ("Élan", ["Élan Vital"])):
+            response = self.client.get('/api/book_mgt/books', {"title": prefix})
+            self.assertEqual([book['title'] for book in response.json()['data']['books']], expected)
+
+    def test_list_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', '--fail-on-scan', stdout=out)
+        self.assertIn('0 query shape(s) with full table scans.', out.getvalue())
+
     def test_book_post(self):
         response = self.client.post('/api/book_mgt/books', data={
             "title": "New Book",
@@ -35,11 +101,357 @@ class BookTests(AuthSetupTestCase):
         }, format='json')
         self.assertEqual(response.status_code, 201)
 
+    def test_book_routes_protected(self):
+        # protection follows each route's auth declaration, per method
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/book_mgt/books').status_code, 200)
+        response = self.client.post('/api/book_mgt/books', data={}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json().get('message'), "Authentication credentials were not provided")
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+        self.assertEqual(self.client.get(f'/api/book_mgt/books/{self.book_id}').status_code, 403)
+
+    def test_public_route_matching_protected_pattern(self):
+        # /books/stats also fits the protected /books/{book_id} pattern
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/book_mgt/books/stats').status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+        self.assertEqual(self.client.get('/api/book_mgt/books/stats').status_code, 200)
+
+    async def test_book_routes_protected_asgi(self):
+        response = await self.async_client.get(f'/api/book_mgt/books/{self.book_id}')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            f'/api/book_mgt/books/{self.book_id}', headers={"Authorization": self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_book_bulk_import(self):
+        rows = [
+            {"title": "Bulk One", "author": "A", "publication_date": "2024-01-01", "isbn": "1", "tag": "custom"},
+            {"title": "Bulk Two", "author": "B", "publication_date": "not a date", "isbn": "2"},
+            {"title": "Bulk Three", "author": "C", "publication_date": "2024-01-03", "isbn": "3"},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows) + "\n{broken"
+        response = self.client.post(
+            '/api/book_mgt/books/bulk?batch_size=2', data=body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json().get('data')
+        self.assertEqual((data.get('created'), data.get('failed')), (2, 2))
+        self.assertEqual([error['row'] for error in data.get('errors')], [2, 4])
+        self.assertEqual(Book.objects.get(title="Bulk One").owner, self.user)
+
+    def test_book_bulk_import_bad_rows(self):
+        # bad bytes after a committed batch only fail their own row
+        body = (
+            '{"title": "Good One", "author": "A", "publication_date": "2024-01-01", "isbn": "1"}\n'.encode()
+            + b'{"title": "Bad \xff", "author": "B", "publication_date": "2024-01-02", "isbn": "2"}\n'
+            + '{"title": "Good Two", "author": "C", "publication_date": "2024-01-03", "isbn": "3"}\n'.encode()
+        )
+        response = self.client.post(
+            '/api/book_mgt/books/bulk?batch_size=1', data=body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json().get('data')
+        self.assertEqual((data.get('created'), data.get('failed')), (2, 1))
+        self.assertEqual(data.get('errors')[0]['row'], 2)
+        self.assertIn("valid text", data.get('errors')[0]['error'])
+
+        body = (
+            "title,author,publication_date,isbn\n"
+            "CSV One,A,2024-01-01,4\n"
+            "CSV Two,B,2024-01-02,5,extra\n"
+        )
+        response = self.client.post('/api/book_mgt/books/bulk', data=body, content_type='text/csv')
+        data = response.json().get('data')
+        self.assertEqual((data.get('created'), data.get('failed')), (1, 1))
+        self.assertEqual(data.get('errors'), [{"row": 2, "error": "Invalid row: too many columns"}])
+
+    def test_book_batch(self):
+        self.set_user_type("user")
+        admin_book = Book.objects.create(**{**self.book_data, "owner": None, "tag": "admin"})
+        doomed = Book.objects.create(**self.book_data)
+        before = Book.objects.get(id=self.book_id).date_updated
+        operations = [
+            {"op": "create", "data": {"title": "Batch Book", "author": "A", "publication_date": "2024-03-01",
+                                      "isbn": "111", "tag": "custom"}},
+            {"op": "update", "id": self.book_id, "data": {"title": "Batch Title"}},
+            {"op": "update", "id": admin_book.id, "data": {"title": "Not Mine"}},
+            {"op": "delete", "id": doomed.id},
+            {"op": "delete", "id": 0},
+        ]
+        response = self.client.post('/api/book_mgt/books/batch', data={"operations": operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual((data.get('succeeded'), data.get('failed')), (3, 2))
+        self.assertEqual([result['status'] for result in data.get('results')], [201, 200, 403, 204, 404])
+        book = Book.objects.get(id=self.book_id)
+        self.assertEqual(book.title, "Batch Title")
+        self.assertGreater(book.date_updated, before)
+        self.assertEqual(Book.objects.get(title="Batch Book").owner, self.user)
+        self.assertFalse(Book.objects.filter(id=doomed.id).exists())
+
+    def test_book_batch_atomic(self):
+        operations = [
+            {"op": "update", "id": self.book_id, "data": {"title": "Batch Title"}},
+            {"op": "create", "data": {"title": "Missing fields"}},
+        ]
+        response = self.client.post(
+            '/api/book_mgt/books/batch', data={"operations": operations, "atomic": True}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['data']['results']], [424, 400])
+        self.assertEqual(Book.objects.get(id=self.book_id).title, "Sample Book")
+
+    def test_book_stats(self):
+        admin_book = Book.objects.create(**{**self.book_data, "owner": None, "tag": "admin"})
+        Book.objects.bulk_create([Book(**{**self.book_data, "publication_date": "2023-05-01"})])
+        self.client.patch(f'/api/book_mgt/books/{admin_book.id}', data={"author": "Other"}, format='json')
+        self.client.delete(f'/api/book_mgt/books/{self.book_id}')
+        expected = {
+            "tag": {"admin": 1, "custom": 1},
+            "owner": {"none": 1, str(self.user.id): 1},
+            "year": {"2023": 1, "2024": 1},
+            "author": {"Author Name": 1, "Other": 1},
+        }
+        response = self.client.get('/api/book_mgt/books/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], expected)
+        response = self.client.get('/api/book_mgt/books/stats?dimension=year')
+        self.assertEqual(response.json()['data'], {"year": expected["year"]})
+        self.assertEqual(self.client.get('/api/book_mgt/books/stats?dimension=isbn').status_code, 400)
+
+    def test_rebuild_book_stats_command(self):
+        BookStat.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_book_stats', stdout=out)
+        self.assertIn('4 book stat row(s) rebuilt', out.getvalue())
+        self.assertEqual(BookStat.objects.get(dimension="owner", key=str(self.user.id)).count, 1)
+
+    def test_book_stats_early_years(self):
+        # the triggers and a rebuild put a year before 1000 under one key
+        Book.objects.create(**{**self.book_data, "publication_date": "0999-05-01"})
+        counted = dict(BookStat.objects.filter(dimension="year", count__gt=0).values_list("key", "count"))
+        call_command('rebuild_book_stats', stdout=StringIO())
+        rebuilt = dict(BookStat.objects.filter(dimension="year").values_list("key", "count"))
+        self.assertEqual(counted, rebuilt)
+        self.assertEqual(rebuilt["999"], 1)
+
+    def test_book_mine(self):
+        Book.objects.create(**{**self.book_data, "owner": None, "tag": "admin"})
+        mine = [self.book_id] + [Book.objects.create(**self.book_data).id for _ in range(2)]
+        # warms up the token's user
+        self.client.get(f'/api/book_mgt/books/{self.book_id}')
+        # the owner's counter row, then the page itself
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/book_mgt/books/mine?size=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual([book['id'] for book in data.get('books')], mine[::-1][:2])
+        self.assertEqual(data.get('total_books'), 3)
+        response = self.client.get(f"/api/book_mgt/books/mine?size=2&after={data.get('next_cursor')}")
+        self.assertEqual([book['id'] for book in response.json()['data']['books']], [self.book_id])
+
+    def test_normalize_isbn(self):
+        self.assertEqual(normalize_isbn("0-306-40615-2"), "9780306406157")
+        self.assertEqual(normalize_isbn("978 0 306 40615 7"), "9780306406157")
+        self.assertEqual(normalize_isbn("080442957X"), "9780804429573")
+        self.assertIsNone(normalize_isbn("1234567890123"))
+        self.assertIsNone(normalize_isbn("0-306-40615-3"))
+
+    def test_book_get_by_isbn(self):
+        Book.objects.create(**{**self.book_data, "isbn": "0-306-40615-2"})
+        response = self.client.get('/api/book_mgt/books/isbn/978-0306406157')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['isbn'] for book in response.json()['data']], ["0-306-40615-2"])
+        self.assertEqual(self.client.get('/api/book_mgt/books/isbn/not-an-isbn').status_code, 400)
+        # with a shared cache, an ISBN the filter rules out costs no query
+        # once the filter is built
+        with patch.object(ISBNIndex, "shared", True), patch.object(isbn_index, "_filter", None):
+            isbn_index.sync()
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/book_mgt/books/isbn/9780131103627')
+        self.assertEqual(response.status_code, 404)
+
+    def test_isbn_filter_sees_other_processes(self):
+        # a row written by another process: no signal, no version bump here
+        isbn = "0-201-63361-2"
+        Book.objects.bulk_create([Book(**{**self.book_data, "isbn": isbn, "isbn13": normalize_isbn(isbn)})])
+        # the locmem cache isn't shared, so the database has the last word
+        self.assertEqual(self.client.get(f'/api/book_mgt/books/isbn/{isbn}').status_code, 200)
+        response = self.client.post('/api/book_mgt/books', data={**self.book_data, "owner": None, "isbn": isbn},
+                                    format='json')
+        self.assertEqual(response.status_code, 409)
+        # and the filter isn't built or synced for nothing
+        with self.assertNumQueries(0):
+            self.assertTrue(isbn_index.might_contain("9780131103627"))
+        with patch.object(ISBNIndex, "shared", True), patch.object(isbn_index, "_filter", None):
+            isbn_index.sync()
+            version = cache.get(isbn_index.key)
+            # the bump waits for the commit, a catch-up before it would miss the row
+            with self.captureOnCommitCallbacks(execute=True):
+                isbn_index.add(normalize_isbn(isbn))
+                self.assertEqual(cache.get(isbn_index.key), version)
+            self.assertNotEqual(cache.get(isbn_index.key), version)
+            self.assertTrue(isbn_index.might_contain(normalize_isbn(isbn)))
+
+    def test_book_duplicate_isbn(self):
+        book = {"title": "Dup", "author": "A", "publication_date": "2024-01-01", "isbn": "0306406152", "tag": "custom"}
+        response = self.client.post('/api/book_mgt/books', data=book, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/book_mgt/books', data={**book, "isbn": "978-0-306-40615-7"}, format='json')
+        self.assertEqual(response.status_code, 409)
+        # another owner (here the admins) may have the same ISBN
+        response = self.client.post('/api/book_mgt/books', data={**book, "tag": "admin"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        body = "\n".join(json.dumps({**book, "isbn": isbn}) for isbn in ("0306406152", "080442957X", "080442957X"))
+        response = self.client.post('/api/book_mgt/books/bulk', data=body, content_type='application/x-ndjson')
+        data = response.json().get('data')
+        self.assertEqual((data.get('created'), data.get('failed')), (1, 2))
+        self.assertEqual([error['row'] for error in data.get('errors')], [1, 3])
+
+    def test_book_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("title,author,publication_date,isbn,tag\n")
+            f.write("CSV Book,Someone,2024-01-01,123,\n")
+            f.write("Bad Book,Someone,,123,\n")
+        out, err = StringIO(), StringIO()
+        call_command('import_books', f.name, stdout=out, stderr=err)
+        os.remove(f.name)
+        self.assertIn('1 book(s) imported, 1 row(s) failed.', out.getvalue())
+        self.assertEqual(Book.objects.get(title="CSV Book").tag, "admin")
+
+    def test_book_export(self):
+        response = self.client.get('/api/book_mgt/books/export?tag=custom')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.book_id])
+
+        response = self.client.get('/api/book_mgt/books/export?format=csv')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,title,author,publication_date,isbn,tag,date_created,date_updated")
+        self.assertEqual(len(lines), 2)
+
+        response = self.client.get('/api/book_mgt/books/export?updated_since=2999-01-01T00:00:00Z')
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+    def test_book_export_tombstones(self):
+        since = timezone.now().isoformat().replace("+00:00", "Z")
+        doomed = Book.objects.create(**{**self.book_data, "title": "Doomed"})
+        self.assertEqual(self.client.delete(f'/api/book_mgt/books/{doomed.id}').status_code, 204)
+        # an incremental sync hears about the deletion
+        response = self.client.get(f'/api/book_mgt/books/export?updated_since={since}')
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, [{"id": doomed.id, "date_updated": rows[0]["date_updated"], "deleted": True}])
+        response = self.client.get(f'/api/book_mgt/books/export?format=csv&updated_since={since}')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,title,author,publication_date,isbn,tag,date_created,date_updated,deleted")
+        cells = lines[1].split(",")
+        self.assertEqual((cells[0], cells[1:7], cells[8]), (str(doomed.id), [""] * 6, "True"))
+        # a full export just leaves it out
+        response = self.client.get('/api/book_mgt/books/export')
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertNotIn(doomed.id, [row['id'] for row in rows])
+
+    async def test_book_export_asgi(self):
+        # ASGI requests are streamed through the async ORM iterator
+        response = await self.async_client.get(
+            '/api/book_mgt/books/export', headers={"Authorization": self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(json.loads(lines[0])['id'], self.book_id)
+
     def test_book_get(self):
         url = f'/api/book_mgt/books/{self.book_id}'
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, 200)
 
+    def test_book_get_cached(self):
+        url = f'/api/book_mgt/books/{self.book_id}'
+        cache_stats.reset()
+        self.client.get(url, format='json')
+        self.client.get(url, format='json')
+        self.assertEqual(cache_stats.snapshot()['book'], {"hits": 1, "misses": 1})
+
+        # writes invalidate the cached payload, once committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, data={"title": "Renamed"}, format='json')
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.json().get('data').get('title'), "Renamed")
+
+        response = self.client.get('/api/ops/cache/stats')
+        self.assertEqual(response.json().get('data').get('book').get('misses'), 2)
+
+    def test_book_cache_invalidated_on_commit(self):
+        url = f'/api/book_mgt/books/{self.book_id}'
+        self.client.get(url)
+        book = Book.objects.get(id=self.book_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = "Renamed"
+            book.save()
+            # readers still see the committed row, and its payload
+            self.assertIsNotNone(cache.get(book_cache.key(self.book_id)))
+        self.assertIsNone(cache.get(book_cache.key(self.book_id)))
+
+    def test_cache_load_keeps_foreign_lock(self):
+        reads = ReadThroughCache("test", lock_timeout=0.1)
+        cache.set("test:1:lock", "another-loader")
+        # the wait times out, the value is loaded anyway but the lock isn't ours
+        self.assertEqual(reads.get_or_load(1, lambda: "value"), "value")
+        self.assertEqual(cache.get("test:1:lock"), "another-loader")
+
+    def test_book_get_conditional(self):
+        url = f'/api/book_mgt/books/{self.book_id}'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, data={"title": "Renamed"}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_book_list_conditional(self):
+        url = '/api/book_mgt/books?size=5'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        # a fresh page is validated without loading the full rows
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Book.objects.create(**{**self.book_data, "title": "Another Book"})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json().get('data').get('books')), 2)
+
+    def test_db_pool_stats(self):
+        response = self.client.get('/api/ops/db/pool')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json().get('data').get('default').get('vendor'), 'sqlite')
+
+    def test_book_metrics(self):
+        metrics_registry.reset()
+        self.client.get('/api/book_mgt/books')
+        response = self.client.get('/api/ops/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('bookhive_http_request_duration_seconds_count{method="GET",route="/api/book_mgt/books",status="200"} 1', body)
+        self.assertIn('bookhive_db_queries_per_request_count{method="GET",route="/api/book_mgt/books"} 1', body)
+
+    def test_book_query_budget(self):
+        metrics_registry.reset()
+        with self.settings(QUERY_BUDGET=0), self.assertLogs('bookhive.performance', level='WARNING') as logs:
+            self.client.get('/api/book_mgt/books')
+        self.assertIn('GET /api/book_mgt/books ran', logs.output[0])
+        self.assertEqual(query_budget_exceeded.value('GET', '/api/book_mgt/books'), 1)
+
     def test_book_patch(self):
         url = f'/api/book_mgt/books/{self.book_id}'
         response = self.client.patch(url, data={
@@ -69,3 +481,109 @@ class BookTests(AuthSetupTestCase):
         url = f'/api/book_mgt/books/{self.book_id}'
         response = self.client.delete(url, format='json')
         self.assertEqual(response.status_code, 204)
+
+    def test_book_soft_delete(self):
+        url = f'/api/book_mgt/books/{self.book_id}'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url, format='json')
+        self.assertEqual(self.client.get(url).json()['message'], "No Book matches the given query.")
+        self.assertEqual(self.client.delete(url).json()['message'], "No Book matches the given query.")
+        self.assertEqual(self.client.get('/api/book_mgt/books').json()['data']['books'], [])
+        self.assertIsNotNone(Book.all_objects.get(id=self.book_id).date_deleted)
+        self.assertEqual(self.client.get('/api/book_mgt/books/stats?dimension=tag').json()['data'], {"tag": {}})
+        call_command('purge_deleted', stdout=StringIO())
+        self.assertFalse(Book.all_objects.filter(id=self.book_id).exists())
+
+    def test_book_writes_check_permission_in_query(self):
+        self.set_user_type("user")
+        admin_book = Book.objects.create(**{**self.book_data, "owner": None, "tag": "admin"})
+        url = f'/api/book_mgt/books/{self.book_id}'
+        response = self.client.patch(f'/api/book_mgt/books/{admin_book.id}', data={"title": "x"}, format='json')
+        self.assertEqual(response.status_code, 403)
+        # the conditional UPDATE, then the re-read for the response body
+        with self.assertNumQueries(2):
+            response = self.client.patch(url, data={"title": "Lean Title"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['title'], "Lean Title")
+        response = self.client.delete(f'/api/book_mgt/books/{admin_book.id}')
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(Book.objects.filter(id=admin_book.id).exists())
+        with self.assertNumQueries(1):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """
+    Tests for the in-process connection pool used with psycopg2, with
+    sqlite3 connections standing in for the driver's.
+    """
+
+    def test_pool_reuses_connections(self):
+        pool = ConnectionPool(lambda: sqlite3.connect(":memory:"), max_size=2, timeout=0.1)
+        first = pool.getconn()
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        pool.getconn()
+        # both slots are taken, the next caller times out
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        stats = pool.get_stats()
+        self.assertEqual((stats["size"], stats["in_use"], stats["requests_timed_out"]), (2, 2, 1))
+
+    def test_pool_discards_broken_connections(self):
+        def check(connection):
+            connection.execute("SELECT 1")
+
+        pool = ConnectionPool(lambda: sqlite3.connect(":memory:", check_same_thread=False), check=check)
+        broken = pool.getconn()
+        pool.putconn(broken)
+        broken.close()
+        self.assertIsNot(pool.getconn(), broken)
+        self.assertEqual(pool.get_stats()["connections_discarded"], 1)
+
+
+class ReplicaRoutingTests(TestCase):
+    """
+    Tests for read-replica routing, with the test database standing in for
+    a replica.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.routed_to = []
+
+        def view(request):
+            self.routed_to.append(current_replica.get())
+            return HttpResponse(status=201 if request.method == "POST" else 200)
+
+        self.middleware = ReplicaRoutingMiddleware(view, replicas=["default"])
+
+    def test_reads_go_to_replica_until_a_write(self):
+        self.middleware(self.factory.get('/api/book_mgt/books'))
+        self.middleware(self.factory.post('/api/book_mgt/books'))
+        # the client that wrote reads from the primary for a while
+        self.middleware(self.factory.get('/api/book_mgt/books'))
+        self.middleware(self.factory.get('/api/book_mgt/books', REMOTE_ADDR='10.0.0.2'))
+        self.assertEqual(self.routed_to, ["default", None, None, "default"])
+
+    def test_router_reads_from_current_replica(self):
+        router = ReplicaRouter(replicas=["replica_0"])
+        token = current_replica.set("replica_0")
+        try:
+            self.assertEqual(router.db_for_read(Book), "replica_0")
+        finally:
+            current_replica.reset(token)
+        self.assertEqual((router.db_for_read(Book), router.db_for_write(Book)), ("default", "default"))
+        self.assertFalse(router.allow_migrate("replica_0", "books"))
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        replica_health.mark_down("default")
+        try:
+            self.middleware(self.factory.get('/api/book_mgt/books'))
+        finally:
+            replica_health._down_until.clear()
+        self.assertEqual(self.routed_to, [None])
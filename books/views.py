@@ -1,11 +1,30 @@
-from django.shortcuts import get_object_or_404
-from django.core.paginator import Paginator
-from django.db import transaction
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from datetime import datetime
 from typing import List
 from .models import Book
 from .schemas import *
+from .isbn import existing_isbns, isbn_index, normalize_isbn
+from .search import search_books
+from .owners import aowner_books
+from .stats import abook_stats
+from .batch import BatchOperation, apply_batch
+from .importer import detect_format, import_books, iter_lines, iter_rows
+from .exporter import CONTENT_TYPES, astream_export, stream_export
 from bookhiveConfig.auth import *
 from bookhiveConfig.utils import CustomResponse
+from bookhiveConfig.cache import book_cache
+from bookhiveConfig.conditional import is_conditional, make_etag, not_modified, rows_etag, rows_last_modified, set_validators
+from bookhiveConfig.pagination import apaginate_by_page, apaginate_by_cursor
+from bookhiveConfig.queries import filter_iprefix
+from bookhiveConfig.serialization import schema_fields, serialize_rows
+from jobs.queue import enqueue, spool
+from jobs.views import job_accepted
 
 
 api = CustomNinjaAPI.create_api(
@@ -29,78 +48,277 @@ def return_book_data(book):
     ).dict()
 
 
-@api.post("/books", response=BookResponseSchema, auth=BearerAuth())
-@transaction.atomic
-def create_book(request, data: BookCreateSchema):
+def filter_books(id=None, title=None, author=None, tag=None, isbn=None, q=None, deleted=False):
+    # show recently added books first, soft-deleted ones too with `deleted`
+    queryset = (Book.all_objects if deleted else Book.objects).all().order_by('-id')
+    # apply filters dynamically based on the id, title, author, tag, isbn..
+    # title and author are prefix matches, free-text search goes through `q`
+    if id:
+        queryset = queryset.filter(id=id)
+    if title:
+        queryset = filter_iprefix(queryset, 'title', title)
+    if author:
+        queryset = filter_iprefix(queryset, 'author', author)
+    if tag:
+        queryset = queryset.filter(tag=tag)
+    if isbn:
+        queryset = queryset.filter(isbn=isbn)
+    if q:
+        # most relevant first, cursor mode falls back to the id order
+        queryset = search_books(queryset, q)
+    return queryset
+
+
+@api.post("/books", response=BookResponseSchema, auth=AsyncBearerAuth())
+async def create_book(request, data: BookCreateSchema):
     try:
-        book = Book.objects.create(
+        owner = request.user if data.tag != 'admin' else None
+        # the ISBN filter answers for ISBNs we don't have, without a query
+        if await sync_to_async(existing_isbns)([normalize_isbn(data.isbn)], owner.id if owner else None):
+            return CustomResponse.failed(message="A book with this ISBN already exists", status=409)
+        book = await Book.objects.acreate(
             title=data.title,
             author=data.author,
             publication_date=data.publication_date,
             isbn=data.isbn,
             tag=data.tag,
-            owner=request.user if data.tag != 'admin' else None
+            owner=owner
         )
         return CustomResponse.success(data=return_book_data(book), message="Book created successfully", status=201)
     except Exception as e:
         return CustomResponse.failed(message=str(e))
 
 
+@api.post("/books/bulk", response=dict, auth=BearerAuth())
+def bulk_import_books(request, format=None, batch_size: int = None, background: bool = False):
+    # the body is streamed as CSV or NDJSON and inserted in batches, so
+    # memory stays flat no matter how big the upload is
+    try:
+        fmt = detect_format(format, content_type=request.content_type or "")
+        if background:
+            # the upload is only saved here, a worker imports it
+            job = enqueue(
+                "books.import",
+                {"path": spool(request, suffix=f".{fmt}"), "format": fmt, "owner_id": request.user.id,
+                 "batch_size": batch_size},
+                owner=request.user
+            )
+            return job_accepted(job, "Book import queued")
+        report = import_books(
+            iter_rows(iter_lines(request), fmt),
+            owner=request.user,
+            batch_size=batch_size
+        )
+        if report.failed and not report.created:
+            return CustomResponse.failed(data=report.as_dict(), message="No books were imported")
+        return CustomResponse.success(data=report.as_dict(), message="Books imported successfully", status=201)
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+@api.post("/books/batch", response=dict, auth=BearerAuth())
+def batch_books(request, data: BookBatchSchema):
+    # every target is loaded with one query and each kind of write is a
+    # single statement, results are reported per operation
+    try:
+        if len(data.operations) > settings.BOOK_BATCH_MAX_OPERATIONS:
+            return CustomResponse.failed(
+                message=f"A batch can't have more than {settings.BOOK_BATCH_MAX_OPERATIONS} operations"
+            )
+        operations = apply_batch(
+            [BatchOperation(index, item.op, item.id, item.data) for index, item in enumerate(data.operations)],
+            request.user,
+            atomic=data.atomic
+        )
+        results = [operation.as_dict(return_book_data) for operation in operations]
+        failed = sum(1 for operation in operations if operation.error)
+        report = {"succeeded": len(operations) - failed, "failed": failed, "results": results}
+        if data.atomic and failed:
+            return CustomResponse.failed(data=report, message="No operations were applied")
+        return CustomResponse.success(data=report, message="Batch processed successfully")
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
 @api.get("/books", response=List[BookResponseSchema])
-def get_all_books(request, page=1, size=10, id=None, title=None, author=None, tag=None):
+async def get_all_books(request, page=1, size=10, id=None, title=None, author=None, tag=None, isbn=None, q=None,
+                  pagination="page", after=None, before=None, include_total: bool = True):
     try:
-        # show recently added books first
-        queryset = Book.objects.all().order_by('-id')
-        # apply filters dynamically based on the id, title, author, tag
-        if id:
-            queryset = queryset.filter(id=id)
-        if title:
-            queryset = queryset.filter(title__icontains=title)
-        if author:
-            queryset = queryset.filter(author__icontains=author)
-        if tag:
-            queryset = queryset.filter(tag=tag)
-
-        paginator = Paginator(queryset, size)
-        paginated_books = paginator.get_page(page)
-
-        books = [return_book_data(book) for book in paginated_books.object_list]
-
-        return CustomResponse.success(
-            data={
-                "books": books,
-                "page": page,
-                "size": size,
-                "total_pages": paginator.num_pages,
-                "total_books": paginator.count
-            },
+        queryset = filter_books(id=id, title=title, author=author, tag=tag, isbn=isbn, q=q)
+
+        async def paginate(queryset):
+            # cursor mode is opt-in, either explicitly or by passing a cursor
+            if pagination == "cursor" or after or before:
+                return await apaginate_by_cursor(
+                    queryset, size, after=after, before=before, include_total=include_total
+                )
+            return await apaginate_by_page(queryset, page, size, include_total=include_total)
+
+        if is_conditional(request):
+            # check the client's copy against the page's ids and timestamps
+            # first, the full rows are only loaded if it's stale. Deletes
+            # don't move Last-Modified, so lists only validate on the ETag
+            rows, meta = await paginate(queryset.values("id", "date_updated"))
+            response = not_modified(request, rows_etag(rows, meta))
+            if response is not None:
+                return response
+
+        # only pull the columns the response needs, as plain dicts
+        object_list, meta = await paginate(queryset.values(*schema_fields(BookResponseSchema)))
+        etag, last_modified = rows_etag(object_list, meta), rows_last_modified(object_list)
+        if "total" in meta:
+            meta["total_books"] = meta.pop("total")
+
+        books = serialize_rows(BookResponseSchema, object_list, DATETIME_FIELDS)
+
+        response = CustomResponse.success(
+            data={"books": books, **meta},
             message="Books retrieved successfully"
         )
+        return set_validators(response, etag, last_modified)
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+@api.get("/books/mine", response=List[BookResponseSchema], auth=AsyncBearerAuth())
+async def get_my_books(request, page=1, size=10, pagination="cursor", after=None, before=None,
+                       include_total: bool = True):
+    # the caller's own books, rather than filtering the whole catalogue
+    try:
+        data = await aowner_books(
+            request.user.books.all(), request.user.id, page=page, size=size, pagination=pagination,
+            after=after, before=before, include_total=include_total
+        )
+        return CustomResponse.success(data=data, message="Books retrieved successfully")
     except Exception as e:
         return CustomResponse.failed(message=str(e))
 
 
-@api.get("/books/{book_id}", response=BookResponseSchema, auth=BearerAuth())
-def get_book_by_id(request, book_id):
+@api.get("/books/stats", response=dict)
+async def get_book_stats(request, dimension=None):
+    # book counts per tag, owner, publication year and author, read from
+    # the trigger-maintained summary table rather than counted per request
     try:
-        book = get_object_or_404(Book, id=book_id)
-        return CustomResponse.success(data=return_book_data(book), message="Book retrieved successfully")
+        return CustomResponse.success(data=await abook_stats(dimension), message="Book stats retrieved successfully")
     except Exception as e:
         return CustomResponse.failed(message=str(e))
 
 
+@api.post("/books/stats/rebuild", response=dict, auth=BearerAuth())
+def rebuild_stats(request):
+    # recounting every book is left to a worker, like rebuild_book_stats
+    try:
+        # only admins and superusers can rebuild the stats
+        if request.user.user_type == 'user':
+            return CustomResponse.failed(message="You do not have the permission to rebuild the stats.", status=403)
+        return job_accepted(enqueue("books.rebuild_stats", owner=request.user), "Book stats rebuild queued")
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+@api.get("/books/isbn/{isbn}", response=List[BookResponseSchema], auth=AsyncBearerAuth())
+async def get_books_by_isbn(request, isbn):
+    # hyphenated and ISBN-10 forms match too, and ISBNs the filter rules
+    # out are answered without touching the database
+    try:
+        isbn13 = normalize_isbn(isbn)
+        if isbn13 is None:
+            return CustomResponse.failed(message=f"'{isbn}' is not a valid ISBN-10 or ISBN-13")
+        books = []
+        if await isbn_index.amight_contain(isbn13):
+            books = [return_book_data(book) async for book in Book.objects.filter(isbn13=isbn13).order_by('-id')]
+        if not books:
+            return CustomResponse.failed(message="No Book matches the given ISBN.", status=404)
+        return CustomResponse.success(data=books, message="Books retrieved successfully")
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+@api.get("/books/export", auth=AsyncBearerAuth())
+async def export_books(request, format="ndjson", title=None, author=None, tag=None, isbn=None,
+                 updated_since: datetime = None):
+    # declared before /books/{book_id} so "export" isn't taken for an id
+    try:
+        if format not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported format '{format}', expected one of: {', '.join(CONTENT_TYPES)}")
+        # incremental syncs also need to hear about deletions, soft-deleted
+        # books are included and exported as tombstones
+        incremental = updated_since is not None
+        queryset = filter_books(title=title, author=author, tag=tag, isbn=isbn, deleted=incremental)
+        if incremental:
+            # walk the changes in the order they happened
+            queryset = queryset.filter(date_updated__gte=updated_since).order_by('date_updated', 'id')
+        else:
+            queryset = queryset.order_by('id')
+        # ASGI servers need an async iterator, WSGI servers a sync one
+        stream = astream_export if isinstance(request, ASGIRequest) else stream_export
+        response = StreamingHttpResponse(
+            stream(queryset, format, tombstones=incremental), content_type=CONTENT_TYPES[format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="books.{format}"'
+        return response
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+@api.get("/books/{book_id}", response=BookResponseSchema, auth=AsyncBearerAuth())
+async def get_book_by_id(request, book_id):
+    try:
+        # serve the serialized book from the cache, it's rebuilt on a miss
+        # and dropped whenever the book is saved or deleted
+        book_id = int(book_id)
+
+        async def load():
+            return return_book_data(await aget_object_or_404(Book, id=book_id))
+
+        data = await book_cache.aget_or_load(book_id, load)
+        # validators come from the cached payload, so a 304 costs no query
+        etag = make_etag(data["id"], data["date_updated"])
+        last_modified = datetime.fromisoformat(data["date_updated"])
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = CustomResponse.success(data=data, message="Book retrieved successfully")
+        return set_validators(response, etag, last_modified)
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+def modifiable_books(user):
+    # a "user" can't modify admin books they don't own, the check is kept
+    # on the owner_id column so it can go in the write's WHERE clause
+    queryset = Book.objects.all()
+    if user.user_type == "user":
+        queryset = queryset.filter(Q(owner_id=user.id) | ~Q(tag='admin'))
+    return queryset
+
+
+def update_if_permitted(user, book_id, changes):
+    """
+    Applies `changes` with a single conditional UPDATE and returns the
+    updated book, or None when the permission check filtered the row out.
+    Raises Http404 if the book doesn't exist.
+    """
+    if "isbn" in changes:
+        changes["isbn13"] = normalize_isbn(changes["isbn"])
+    updated = modifiable_books(user).filter(id=book_id).update(**changes, date_updated=timezone.now())
+    if not updated:
+        # only a failed write pays for telling a missing book from a forbidden one
+        get_object_or_404(Book.objects.only('id'), id=book_id)
+        return None
+    # update() skips post_save, so the cached payload is dropped here (once committed)
+    book_cache.invalidate(book_id)
+    isbn_index.add(changes.get("isbn13"))
+    return Book.objects.get(id=book_id)
+
+
 @api.patch("/books/{book_id}", response=BookResponseSchema, auth=BearerAuth())
 def update_book(request, book_id, data: BookUpdateSchema):
     try:
-        book = get_object_or_404(Book, id=book_id)
-        # check if the logged-in "user" is the owner of the book or if the book is an admin book
-        if request.user.user_type == "user":
-            if book.owner != request.user and book.tag == 'admin':
-                return CustomResponse.failed(message="You do not have the permission to update this book.", status=403)
-        for attr, value in data.dict().items():
-            if value is not None:
-                setattr(book, attr, value)
-        book.save()
+        book = update_if_permitted(
+            request.user, book_id, {attr: value for attr, value in data.dict().items() if value is not None}
+        )
+        if book is None:
+            return CustomResponse.failed(message="You do not have the permission to update this book.", status=403)
         return CustomResponse.success(data=return_book_data(book), message="Book updated successfully")
     except Exception as e:
         return CustomResponse.failed(message=str(e))
@@ -109,17 +327,10 @@ def update_book(request, book_id, data: BookUpdateSchema):
 @api.put("/books/{book_id}", response=BookResponseSchema, auth=BearerAuth())
 def put_book(request, book_id, data: BookUpdateSchema):
     try:
-        book = get_object_or_404(Book, id=book_id)
-        # Check if the logged-in "user" is the owner of the book or if the book is an admin book
-        if request.user.user_type == "user":
-            if book.owner != request.user and book.tag == 'admin':
-                return CustomResponse.failed(message="You do not have the permission to replace this book.", status=403)
-        book.title = data.title if data.title else book.title
-        book.author = data.author if data.author else book.author
-        book.publication_date = data.publication_date if data.publication_date else book.publication_date
-        book.isbn = data.isbn if data.isbn else book.isbn
-        book.tag = data.tag if data.tag else book.tag
-        book.save()
+        # empty values keep the current ones
+        book = update_if_permitted(request.user, book_id, {attr: value for attr, value in data.dict().items() if value})
+        if book is None:
+            return CustomResponse.failed(message="You do not have the permission to replace this book.", status=403)
         return CustomResponse.success(data=return_book_data(book), message="Book updated successfully")
     except Exception as e:
         return CustomResponse.failed(message=str(e))
@@ -128,14 +339,13 @@ def put_book(request, book_id, data: BookUpdateSchema):
 @api.delete("/books/{book_id}", response=dict, auth=BearerAuth())
 def delete_book(request, book_id):
     try:
-        book = get_object_or_404(Book, id=book_id)
-        # Check if the request user is the owner of the book or if the book is an admin book
-        if request.user.user_type == "user":
-            if book.owner != request.user and book.tag == 'admin':
-                return CustomResponse.failed(message="You do not have the permission to delete this book.", status=403)
-        book.delete()
+        # a soft delete, a single UPDATE ... WHERE id=? AND <permission>,
+        # purge_deleted removes the row later
+        now = timezone.now()
+        if not modifiable_books(request.user).filter(id=book_id).update(date_deleted=now, date_updated=now):
+            get_object_or_404(Book.objects.only('id'), id=book_id)
+            return CustomResponse.failed(message="You do not have the permission to delete this book.", status=403)
+        book_cache.invalidate(book_id)
         return CustomResponse.success(message="Book deleted successfully", status=204)
     except Exception as e:
         return CustomResponse.failed(message=str(e))
-
-
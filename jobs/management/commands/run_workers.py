@@ -0,0 +1,30 @@
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from jobs.worker import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs from the database queue until stopped (SIGINT/SIGTERM finish the current jobs first)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                            help="How many jobs to run at once, each on its own thread.")
+        parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL,
+                            help="Seconds to wait before looking again when the queue is empty.")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(options["concurrency"], options["poll_interval"], burst=options["burst"])
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping once the running jobs are done...")
+            pool.stop.set()
+
+        handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            processed = pool.run()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f"{processed} job(s) processed."))
@@ -0,0 +1,56 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from users.models import CustomUser
+
+
+class Job(models.Model):
+    STATUSES = [
+        ('queued', ('Queued')),
+        ('running', ('Running')),
+        ('succeeded', ('Succeeded')),
+        ('failed', ('Failed')),
+    ]
+
+    # the name a task was registered under (jobs/queue.py), its keyword
+    # arguments are the payload
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=9, choices=STATUSES, default='queued')
+    owner = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    # how far the task got, `total` stays null when it isn't known upfront
+    # (e.g. a streamed upload)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    # queued jobs aren't claimed before this, retries are pushed back
+    run_after = models.DateTimeField(default=timezone.now)
+    # the worker running the job, `locked_at` is refreshed with every
+    # progress update so a job whose worker died can be told apart
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
+    date_finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # workers only ever look for queued jobs that are due and running
+        # ones that went stale, finished jobs stay out of both indexes
+        indexes = [
+            models.Index(fields=['run_after', 'id'], condition=Q(status='queued'), name='job_queued_idx'),
+            models.Index(fields=['locked_at'], condition=Q(status='running'), name='job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    def set_progress(self, progress, total=None):
+        # also a heartbeat, a running job that reports progress isn't stale
+        self.progress = progress
+        fields = {"progress": progress, "locked_at": timezone.now(), "date_updated": timezone.now()}
+        if total is not None:
+            self.total = fields["total"] = total
+        Job.objects.filter(id=self.id).update(**fields)
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+
+class Task:
+    def __init__(self, kind, func, max_attempts=None):
+        self.kind = kind
+        self.func = func
+        self.max_attempts = max_attempts
+
+    def __call__(self, job):
+        return self.func(job, **job.payload)
+
+
+# kind -> Task, filled by the `tasks` modules of the installed apps
+registry = {}
+
+
+def task(kind, max_attempts=None):
+    """
+    Registers the decorated function as the task for jobs of `kind`. It's
+    called with the job and the job's payload as keyword arguments, and
+    what it returns (JSON serializable) becomes the job's result.
+    """
+    def decorator(func):
+        registry[kind] = Task(kind, func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, owner=None, total=None, run_after=None):
+    if kind not in registry:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        owner=owner,
+        total=total,
+        max_attempts=registry[kind].max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_after=run_after or timezone.now()
+    )
+
+
+def spool(stream, suffix=""):
+    """
+    Copies a stream (e.g. a request body) to a file in JOB_FILES_DIR for a
+    job to read later, returns its path. The task removes the file.
+    """
+    os.makedirs(settings.JOB_FILES_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.JOB_FILES_DIR, suffix=suffix, delete=False) as file:
+        shutil.copyfileobj(stream, file, 64 * 1024)
+    return file.name
+
+
+def track_progress(job, items, every=1000):
+    # passes `items` through, reporting the count every `every` items
+    count = 0
+    for count, item in enumerate(items, start=1):
+        yield item
+        if count % every == 0:
+            job.set_progress(count)
+    job.set_progress(count)
+
+
+def claim(worker, limit=1):
+    """
+    Moves up to `limit` due jobs from queued to running for `worker` and
+    returns them. Concurrent workers never get the same job: on databases
+    with SKIP LOCKED each one skips the rows another is claiming instead of
+    waiting on them, elsewhere (SQLite) every job is taken with its own
+    conditional UPDATE and only the worker whose UPDATE hit it has it.
+    """
+    using = router.db_for_write(Job)
+    now = timezone.now()
+    due = Job.objects.using(using).filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+    changes = {"status": 'running', "locked_by": worker, "locked_at": now, "attempts": F("attempts") + 1}
+
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=using):
+            ids = list(due.select_for_update(skip_locked=True).values_list("id", flat=True)[:limit])
+            Job.objects.using(using).filter(id__in=ids).update(**changes)
+    else:
+        ids = []
+        # a few spare candidates in case other workers take some first
+        for pk in due.values_list("id", flat=True)[:limit * 2]:
+            if Job.objects.using(using).filter(id=pk, status='queued').update(**changes):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(Job.objects.using(using).filter(id__in=ids).order_by('id'))
+
+
+def requeue_stale(timeout=None):
+    """
+    Running jobs that haven't reported in `timeout` seconds (their worker
+    was killed) go back to the queue, or fail once out of attempts.
+    Returns how many were requeued.
+    """
+    timeout = settings.JOB_LOCK_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=timeout))
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status='failed', error="The worker running the job stopped responding", locked_by="", date_finished=now
+    )
+    return stale.update(status='queued', locked_by="", run_after=now)
+
+
+def run(job):
+    """
+    Runs a claimed job and records its outcome. A task that raises is
+    retried after JOB_RETRY_BACKOFF seconds, doubled at every attempt,
+    until it runs out of attempts. Returns the job's new status.
+    """
+    # the updates are conditional on the lock, a job requeued as stale and
+    # claimed by another worker meanwhile is theirs now
+    mine = Job.objects.filter(id=job.id, status='running', locked_by=job.locked_by)
+    try:
+        task = registry.get(job.kind)
+        if task is None:
+            raise LookupError(f"No task is registered for '{job.kind}' jobs")
+        result = task(job)
+    except Exception as e:
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            backoff = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            mine.update(
+                status='queued', error=str(e), locked_by="", run_after=now + timedelta(seconds=backoff),
+                date_updated=now
+            )
+            return 'queued'
+        mine.update(status='failed', error=str(e), locked_by="", date_finished=now, date_updated=now)
+        return 'failed'
+    now = timezone.now()
+    mine.update(status='succeeded', result=result, error="", locked_by="", date_finished=now, date_updated=now)
+    return 'succeeded'
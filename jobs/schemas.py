@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Any, Optional
+
+
+class JobResponseSchema(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: int
+    total: Optional[int]
+    result: Any
+    error: str
+    attempts: int
+    max_attempts: int
+    date_created: str
+    date_updated: str
+    date_finished: Optional[str]
@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from bookhiveConfig.utils import AuthSetupTestCase
+from books.models import Book
+from .models import Job
+from .queue import Task, claim, enqueue, registry, requeue_stale, run
+
+User = get_user_model()
+
+
+def echo(job, value):
+    return {"value": value}
+
+
+def broken(job):
+    raise RuntimeError("boom")
+
+
+@patch.dict(registry, {"tests.echo": Task("tests.echo", echo), "tests.broken": Task("tests.broken", broken, 2)})
+class JobTests(AuthSetupTestCase):
+    """
+    A test case class for handling background job tests.
+
+    This class inherits from AuthSetupTestCase. It includes test cases for the job queue, the workers and the BookHive Jobs API.
+    """
+
+    def setUp(self):
+        self.authenticate()
+
+    def test_job_run(self):
+        job = enqueue("tests.echo", {"value": 42}, owner=self.user)
+        self.assertEqual(job.status, "queued")
+        [claimed] = claim("worker-1", limit=5)
+        # a claimed job can't be claimed again
+        self.assertEqual(claim("worker-2"), [])
+        self.assertEqual((claimed.status, claimed.locked_by, claimed.attempts), ("running", "worker-1", 1))
+        self.assertEqual(run(claimed), "succeeded")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), ("succeeded", {"value": 42}, ""))
+        self.assertIsNotNone(job.date_finished)
+        with self.assertRaises(ValueError):
+            enqueue("tests.unknown")
+
+    def test_job_retries(self):
+        job = enqueue("tests.broken")
+        self.assertEqual(job.max_attempts, 2)
+        self.assertEqual(run(claim("worker-1")[0]), "queued")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ("queued", "boom"))
+        # backed off, not due yet
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(claim("worker-1"), [])
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        self.assertEqual(run(claim("worker-1")[0]), "failed")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+
+    def test_requeue_stale_jobs(self):
+        job = enqueue("tests.echo", {"value": 1})
+        [lost] = claim("worker-1")
+        self.assertEqual(requeue_stale(timeout=60), 0)
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(requeue_stale(timeout=60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ("queued", ""))
+        # the worker that lost it can't record an outcome anymore
+        run(lost)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ("queued", None))
+
+    def test_run_workers_command(self):
+        jobs = [enqueue("tests.echo", {"value": value}) for value in range(3)]
+        out = StringIO()
+        call_command('run_workers', '--burst', '--concurrency', '1', stdout=out)
+        self.assertIn('3 job(s) processed.', out.getvalue())
+        self.assertEqual(
+            [job.result for job in Job.objects.filter(id__in=[job.id for job in jobs]).order_by('id')],
+            [{"value": 0}, {"value": 1}, {"value": 2}]
+        )
+
+    def test_job_get(self):
+        job = enqueue("tests.echo", {"value": 1}, owner=self.user)
+        response = self.client.get(f'/api/job_mgt/jobs/{job.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['status'], "queued")
+        other = enqueue("tests.echo", {"value": 2}, owner=User.objects.create(email="other@example.com"))
+        self.set_user_type("user")
+        self.assertEqual(self.client.get(f'/api/job_mgt/jobs/{other.id}').status_code, 403)
+        self.assertEqual(self.client.get(f'/api/job_mgt/jobs/{job.id}').status_code, 200)
+
+    def test_book_import_in_background(self):
+        rows = [
+            {"title": "Queued One", "author": "A", "publication_date": "2024-01-01", "isbn": "1", "tag": "custom"},
+            {"title": "Queued Two", "author": "B", "publication_date": "not a date", "isbn": "2"},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows)
+        with tempfile.TemporaryDirectory() as files, override_settings(JOB_FILES_DIR=files):
+            response = self.client.post(
+                '/api/book_mgt/books/bulk?background=true', data=body, content_type='application/x-ndjson'
+            )
+            self.assertEqual(response.status_code, 202)
+            self.assertFalse(Book.objects.filter(title="Queued One").exists())
+            call_command('run_workers', '--burst', '--concurrency', '1', stdout=StringIO())
+            self.assertEqual(os.listdir(files), [])
+        response = self.client.get(response["Location"])
+        data = response.json()['data']
+        self.assertEqual((data['status'], data['progress']), ("succeeded", 2))
+        self.assertEqual((data['result']['created'], data['result']['failed']), (1, 1))
+        self.assertEqual(Book.objects.get(title="Queued One").owner, self.user)
+
+    def test_book_stats_rebuild_in_background(self):
+        response = self.client.post('/api/book_mgt/books/stats/rebuild')
+        self.assertEqual(response.status_code, 202)
+        call_command('run_workers', '--burst', '--concurrency', '1', stdout=StringIO())
+        job = Job.objects.get(id=response.json()['data']['id'])
+        self.assertEqual((job.kind, job.status), ("books.rebuild_stats", "succeeded"))
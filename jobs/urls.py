@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import api
+
+urlpatterns = [
+    path('', api.urls),
+]
@@ -0,0 +1,52 @@
+from django.shortcuts import aget_object_or_404
+from .models import Job
+from .schemas import *
+from bookhiveConfig.auth import *
+from bookhiveConfig.utils import CustomResponse
+
+
+api = CustomNinjaAPI.create_api(
+    title="BookHive Jobs API",
+    description="This documentation provides endpoints for following background jobs.",
+    version="1.0.0",
+    urls_namespace="jobs"
+)
+
+
+def return_job_data(job):
+    # this function returns the details of the passed-in job
+    return JobResponseSchema(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress,
+        total=job.total,
+        result=job.result,
+        error=job.error,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        date_created=job.date_created.isoformat(),
+        date_updated=job.date_updated.isoformat(),
+        date_finished=job.date_finished.isoformat() if job.date_finished else None
+    ).dict()
+
+
+def job_accepted(job, message):
+    # the 202 heavy endpoints answer with when they hand their work to a
+    # job, Location is where to poll for its progress
+    response = CustomResponse.success(data=return_job_data(job), message=message, status=202)
+    response["Location"] = f"/api/job_mgt/jobs/{job.id}"
+    return response
+
+
+@api.get("/jobs/{job_id}", response=JobResponseSchema, auth=AsyncBearerAuth())
+async def get_job(request, job_id):
+    # not cached, it's meant to be polled while the job runs
+    try:
+        job = await aget_object_or_404(Job, id=int(job_id))
+        # users only see their own jobs, admins and superusers see them all
+        if request.user.user_type == 'user' and job.owner_id != request.user.id:
+            return CustomResponse.failed(message="You do not have the permission to view this resource.", status=403)
+        return CustomResponse.success(data=return_job_data(job), message="Job retrieved successfully")
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
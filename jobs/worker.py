@@ -0,0 +1,101 @@
+import logging
+import os
+import socket
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, connections
+from .queue import claim, requeue_stale, run
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    Claims and runs jobs one at a time until `stop` is set, sleeping
+    `poll_interval` seconds whenever the queue is empty. In `burst` mode
+    it returns as soon as the queue is empty instead. `idle` is called
+    whenever it finds the queue empty.
+    """
+
+    def __init__(self, name=None, poll_interval=None, burst=False, stop=None, idle=None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.burst = burst
+        self.stop = stop or threading.Event()
+        self.idle = idle
+        self.processed = 0
+
+    def run_once(self):
+        # the same connection hygiene as a request: drop connections that
+        # are broken or past their CONN_MAX_AGE before and after each job
+        close_old_connections()
+        try:
+            jobs = claim(self.name)
+            for job in jobs:
+                status = run(job)
+                self.processed += 1
+                logger.info("%s job #%s %s (attempt %s)", job.kind, job.id, status, job.attempts)
+            return bool(jobs)
+        finally:
+            close_old_connections()
+
+    def loop(self):
+        try:
+            while not self.stop.is_set():
+                if self.run_once():
+                    continue
+                if self.idle is not None:
+                    self.idle()
+                if self.burst:
+                    return
+                self.stop.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+
+class WorkerPool:
+    """
+    `concurrency` workers on as many threads of this process. The first
+    one also looks for stale jobs when idle, at most every
+    JOB_LOCK_TIMEOUT / 2 seconds. With one worker it runs on the calling
+    thread.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None, burst=False):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.stop = threading.Event()
+        self.workers = [
+            Worker(
+                f"{socket.gethostname()}:{os.getpid()}:{index}", poll_interval, burst, self.stop,
+                idle=self.requeue_stale if index == 0 else None
+            )
+            for index in range(self.concurrency)
+        ]
+        self._stale_checked = None
+
+    def requeue_stale(self):
+        now = time.monotonic()
+        if self._stale_checked is not None and now - self._stale_checked < settings.JOB_LOCK_TIMEOUT / 2:
+            return
+        self._stale_checked = now
+        requeued = requeue_stale()
+        if requeued:
+            logger.warning("%s stale job(s) requeued", requeued)
+
+    def run(self):
+        if self.concurrency == 1:
+            self.workers[0].loop()
+            return self.processed
+        threads = [threading.Thread(target=worker.loop, name=worker.name, daemon=True) for worker in self.workers]
+        for thread in threads:
+            thread.start()
+        # joined with a timeout so the main thread still gets signals
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+        return self.processed
+
+    @property
+    def processed(self):
+        return sum(worker.processed for worker in self.workers)
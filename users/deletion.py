@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from books.deletion import db_cascades, purge_books, soft_delete_books
+from books.models import Book
+
+User = get_user_model()
+
+
+def soft_delete_user(user):
+    """
+    Hides the user and all their books at once: two UPDATEs, nothing is
+    loaded into memory. The user can't log in or use their tokens anymore,
+    the rows are removed later by `purge_users`.
+    """
+    with transaction.atomic():
+        user.date_deleted = timezone.now()
+        user.is_active = False
+        # saved rather than updated so the signals drop the cached user
+        # and the tokens resolved to it
+        user.save(update_fields=["date_deleted", "is_active"])
+        soft_delete_books(Book.objects.filter(owner_id=user.id))
+
+
+def purge_users(before=None, batch_size=None):
+    """
+    Deletes the soft-deleted users (those deleted before `before`, if
+    given) one at a time, after their books have been purged in batches,
+    or in the same statement when the database cascades them. Returns
+    (users, books) deleted.
+    """
+    batch_size = batch_size or settings.DELETE_PURGE_BATCH_SIZE
+    users = User.all_objects.exclude(date_deleted=None)
+    if before is not None:
+        users = users.filter(date_deleted__lt=before)
+    purged_users = purged_books = 0
+    while True:
+        ids = list(users.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return purged_users, purged_books
+        for user_id in ids:
+            if not db_cascades():
+                purged_books += purge_books(Book.all_objects.filter(owner_id=user_id), batch_size)
+            # what's left is small: group and permission links, admin log entries
+            User.all_objects.filter(id=user_id).delete()
+            purged_users += 1
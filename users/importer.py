@@ -0,0 +1,102 @@
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction, DatabaseError
+from django.db.models import Q
+from pydantic import ValidationError
+from books.importer import ImportReport, format_validation_error
+from bookhiveConfig.hashing import BulkHasher
+from .schemas import UserSignupSchema
+
+User = get_user_model()
+
+
+def build_user(row):
+    # validate the row the same way signup validates its body, the
+    # password is hashed later with the rest of the batch
+    data = UserSignupSchema(**row)
+    email = User.objects.normalize_email(data.email.lower())
+    user = User(
+        email=email,
+        username=email,
+        first_name=data.first_name,
+        last_name=data.last_name,
+        user_type=data.user_type
+    )
+    return user, data.password
+
+
+def import_users(rows, batch_size=None, report=None, hasher=None):
+    """
+    Validates and inserts users from an iterable of dicts in `bulk_create`
+    batches. Each batch costs one query to find the emails already taken
+    and one INSERT, its passwords are hashed in parallel by `hasher` (a
+    BulkHasher, threads by default). Invalid and duplicate rows are
+    reported and skipped without aborting the load.
+    """
+    if hasher is None:
+        with BulkHasher(settings.USER_IMPORT_HASH_WORKERS) as hasher:
+            return import_users(rows, batch_size, report, hasher)
+
+    batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+    report = report or ImportReport()
+    numbered_rows = enumerate(rows, start=1)
+
+    while True:
+        chunk = list(islice(numbered_rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for row_number, row in chunk:
+            if isinstance(row, Exception):
+                report.add_error(row_number, f"Invalid row: {row}")
+                continue
+            try:
+                batch.append((row_number, *build_user(row)))
+            except ValidationError as e:
+                report.add_error(row_number, format_validation_error(e))
+            except TypeError:
+                report.add_error(row_number, "Invalid row: expected an object")
+        batch = _drop_duplicates(batch, report)
+        for (_, user, _), encoded in zip(batch, hasher(password for _, _, password in batch)):
+            user.password = encoded
+        _insert_batch([(row_number, user) for row_number, user, _ in batch], report)
+    return report
+
+
+def _drop_duplicates(batch, report):
+    # emails already taken, in the database (one query for the whole
+    # batch, soft-deleted users included) or earlier in the batch
+    emails = {user.email for _, user, _ in batch}
+    taken = set()
+    if emails:
+        for email, username in User.all_objects.filter(Q(email__in=emails) | Q(username__in=emails)).values_list(
+            "email", "username"
+        ):
+            taken.update((email, username))
+    unique = []
+    for row_number, user, password in batch:
+        if user.email in taken:
+            report.add_error(row_number, "A user with this email address already exists")
+            continue
+        taken.add(user.email)
+        unique.append((row_number, user, password))
+    return unique
+
+
+def _insert_batch(batch, report):
+    if not batch:
+        return
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in batch])
+        report.created += len(batch)
+    except DatabaseError:
+        # find the offending rows by retrying the batch one row at a time
+        for row_number, user in batch:
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+                report.created += 1
+            except DatabaseError as e:
+                report.add_error(row_number, str(e))
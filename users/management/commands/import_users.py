@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from books.importer import FORMATS, ImportReport, detect_format, iter_lines, iter_rows
+from bookhiveConfig.hashing import BulkHasher
+from users.importer import import_users
+
+
+class Command(BaseCommand):
+    help = "Streams users from a CSV or NDJSON file into the database in batches, hashing passwords on a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The CSV or NDJSON file to import.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=settings.USER_IMPORT_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=settings.USER_IMPORT_HASH_WORKERS,
+                            help="How many processes hash passwords.")
+        parser.add_argument("--threads", action="store_true", help="Hash on threads instead of processes.")
+        parser.add_argument("--max-errors", type=int, default=100, help="How many row errors to print.")
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options["format"], filename=options["path"])
+        report = ImportReport(max_errors=options["max_errors"])
+        try:
+            with open(options["path"], "rb") as stream, \
+                    BulkHasher(options["workers"], processes=not options["threads"]) as hasher:
+                import_users(
+                    iter_rows(iter_lines(stream), fmt),
+                    batch_size=options["batch_size"],
+                    report=report,
+                    hasher=hasher
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f"{report.created} user(s) imported, {report.failed} row(s) failed."))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from books.deletion import purge_books
+from books.models import Book
+from users.deletion import purge_users
+
+
+class Command(BaseCommand):
+    help = "Removes soft-deleted books and users in bounded batches. Meant to run periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.DELETE_PURGE_BATCH_SIZE)
+        parser.add_argument("--older-than", type=int, default=0,
+                            help="Only purge rows soft-deleted at least this many seconds ago.")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(seconds=options["older_than"])
+        books = purge_books(
+            Book.all_objects.exclude(date_deleted=None).filter(date_deleted__lt=before), options["batch_size"]
+        )
+        users, owned_books = purge_users(before, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{users} user(s) and {books + owned_books} book(s) purged."))
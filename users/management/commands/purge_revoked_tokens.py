@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = "Deletes revoked refresh tokens that have expired. Meant to run periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        # delete in small batches so the table isn't locked for long
+        while True:
+            ids = list(
+                RevokedToken.objects.filter(expires_at__lt=now).values_list("id", flat=True)[:options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{deleted} expired revoked token(s) deleted."))
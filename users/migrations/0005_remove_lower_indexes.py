@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-18 19:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_email_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_first_name_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_last_name_lower_idx',
+        ),
+    ]
@@ -1,8 +1,14 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models import Q
 
 
 class UserManager(BaseUserManager):
+    # soft-deleted users are hidden everywhere (they can't log in or use
+    # their tokens either), `CustomUser.all_objects` has them
+    def get_queryset(self):
+        return super().get_queryset().filter(date_deleted=None)
+
     def create_user(self, email=None, password=None, **extra_fields):
         if not email:
             raise ValueError("Kindly enter an email address for this user.")
@@ -38,11 +44,31 @@ class CustomUser(AbstractUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     user_type = models.CharField(max_length=10, choices=USER_TYPES, null=True, blank=True)
+    # set when the user is soft-deleted, purge_deleted removes the row later
+    date_deleted = models.DateTimeField(null=True, blank=True)
     objects = UserManager()
+    all_objects = models.Manager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['date_deleted'], condition=Q(date_deleted__isnull=False), name='user_deleted_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
+
+class RevokedToken(models.Model):
+    """
+    Durable storage for revoked refresh tokens. A row is only useful until
+    the token expires, `purge_revoked_tokens` deletes the expired ones.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    date_revoked = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from bookhiveConfig.auth import token_user_cache
+from bookhiveConfig.cache import user_cache
+from .models import CustomUser
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # drop the cached payload so the next read rebuilds it, once committed
+    user_cache.invalidate(instance.pk, using=kwargs.get("using"))
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_token_user_cache(sender, instance, **kwargs):
+    # tokens keep resolving to the user, so they must pick up the change
+    # once it's visible to the requests that reload the user
+    transaction.on_commit(lambda: token_user_cache.invalidate_user(instance.pk), using=kwargs.get("using"))
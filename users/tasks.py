@@ -0,0 +1,19 @@
+import os
+from django.conf import settings
+from jobs.queue import task, track_progress
+from books.importer import iter_lines, iter_rows
+from .importer import import_users
+
+
+@task("users.import", max_attempts=1)
+def import_users_job(job, path, format, batch_size=None):
+    # not retried, a second run would report the users the first one
+    # created as duplicates. Progress counts the rows read so far
+    try:
+        with open(path, "rb") as stream:
+            rows = track_progress(
+                job, iter_rows(iter_lines(stream), format), every=batch_size or settings.USER_IMPORT_BATCH_SIZE
+            )
+            return import_users(rows, batch_size=batch_size).as_dict()
+    finally:
+        os.remove(path)
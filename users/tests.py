@@ -1,5 +1,20 @@
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 from django.contrib.auth import get_user_model
-from bookhiveConfig.utils import AuthSetupTestCase
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.utils import timezone
+from bookhiveConfig.utils import AuthSetupTestCase, generate_user_token
+from bookhiveConfig.auth import token_user_cache
+from bookhiveConfig.revocation import revocation_store
+from bookhiveConfig.throttling import login_email_throttle
+from books.models import Book
+from .models import RevokedToken
 
 User = get_user_model()
 
@@ -25,6 +40,73 @@ class UserTests(AuthSetupTestCase):
         response = self.client.get('/api/user_mgt/users')
         self.assertEqual(response.status_code, 200)
 
+    def test_user_list_filters_match_substrings(self):
+        self.set_user_type('admin')
+        response = self.client.get('/api/user_mgt/users', {"email": "@GMAAIL.com"})
+        self.assertEqual([user['id'] for user in response.json()['data']['users']], [self.app_user_id])
+        response = self.client.get('/api/user_mgt/users', {"last_name": "oe"})
+        self.assertEqual([user['id'] for user in response.json()['data']['users']], [self.user.id])
+
+    def test_user_list_cursor(self):
+        self.set_user_type('admin')
+        response = self.client.get('/api/user_mgt/users?pagination=cursor&size=1')
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual(data.get('users')[0]['id'], self.user.id)
+        self.assertEqual(data.get('total_users'), 2)
+
+        response = self.client.get(f"/api/user_mgt/users?size=1&after={data.get('next_cursor')}")
+        data = response.json().get('data')
+        self.assertEqual(data.get('users')[0]['id'], self.app_user_id)
+
+    def test_user_books(self):
+        Book.objects.create(title="Owned", author="A", publication_date="2024-01-01", isbn="1", tag="custom",
+                            owner_id=self.app_user_id)
+        url = f'/api/user_mgt/users/{self.app_user_id}/books?pagination=page'
+        self.set_user_type('user')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.set_user_type('admin')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual([book['title'] for book in data.get('books')], ["Owned"])
+        self.assertEqual((data.get('total_books'), data.get('total_pages')), (1, 1))
+
+    def test_user_bulk_import(self):
+        row = {"first_name": "Bulk", "last_name": "User", "password": "Bulk_user!12"}
+        rows = [
+            {**row, "email": "bulk1@example.com"},
+            {**row, "email": self.data["email"]},
+            {**row, "email": "bulk2@example.com", "password": "short"},
+            {**row, "email": "BULK1@example.com"},
+            {**row, "email": "bulk3@example.com"},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows)
+        url = '/api/user_mgt/users/bulk'
+        self.set_user_type('user')
+        response = self.client.post(url, data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 403)
+        self.set_user_type('admin')
+        response = self.client.post(url, data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        data = response.json().get('data')
+        self.assertEqual((data.get('created'), data.get('failed')), (2, 3))
+        self.assertEqual([error['row'] for error in data.get('errors')], [3, 2, 4])
+        user = User.objects.get(email="bulk3@example.com")
+        self.assertEqual(user.username, "bulk3@example.com")
+        self.assertTrue(user.check_password("Bulk_user!12"))
+
+    def test_import_users_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("email,first_name,last_name,password\n")
+            f.write("csv1@example.com,Csv,One,Csv_user!123\n")
+            f.write("csv2@example.com,Csv,Two,Csv_user!456\n")
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_users', f.name, '--workers', '2', stdout=out, stderr=StringIO())
+        self.assertIn('2 user(s) imported, 0 row(s) failed', out.getvalue())
+        self.assertTrue(User.objects.get(email="csv2@example.com").check_password("Csv_user!456"))
+
     def test_user_post(self):
         response = self.client.post('/api/user_mgt/signup', data={
             "email": "tester22@gmail.com",
@@ -40,6 +122,83 @@ class UserTests(AuthSetupTestCase):
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, 200)
 
+    def test_user_token_cached(self):
+        url = f'/api/user_mgt/users/{self.app_user_id}'
+        token_user_cache.clear()
+        self.client.get(url, format='json')
+        access_token = self.token.split(" ")[1]
+        self.assertEqual(token_user_cache.get(access_token), self.user)
+        # every request gets its own instance
+        cached = token_user_cache.get(access_token)
+        cached.first_name = "changed"
+        self.assertIsNot(token_user_cache.get(access_token), cached)
+        self.assertNotEqual(token_user_cache.get(access_token).first_name, "changed")
+
+        # a warm token and payload cache means no queries at all
+        with self.assertNumQueries(0):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # saving the user drops the tokens that resolve to it, once committed
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save()
+            self.assertEqual(token_user_cache.get(access_token), self.user)
+        self.assertTrue(callbacks)
+        self.assertIsNone(token_user_cache.get(access_token))
+
+    def test_login_throttled(self):
+        credentials = {"email": "tester@gmaail.com", "password": "wrong"}
+        with patch.object(login_email_throttle, 'capacity', 2):
+            statuses = [self.client.post('/api/user_mgt/login', data=credentials, format='json').status_code
+                        for _ in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_login_rehashes_password(self):
+        # a hash made by a non-preferred hasher is upgraded on login
+        self.user.password = make_password('John_doe!3', hasher='pbkdf2_sha1')
+        self.user.save()
+        response = self.client.post('/api/user_mgt/login', data={
+            "email": "johh_doe@gmail.com", "password": "John_doe!3"
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_token_refresh_rotates(self):
+        refresh = generate_user_token(self.user)["refresh"]
+        response = self.client.post('/api/user_mgt/token/refresh', data={"refresh_token": refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json().get('refresh')
+        self.assertNotEqual(rotated, refresh)
+
+        # the rotated-out token can't be used again
+        response = self.client.post('/api/user_mgt/token/refresh', data={"refresh_token": refresh}, format='json')
+        self.assertEqual(response.json().get('message'), "Token error: Token is blacklisted")
+
+        # revocations outlive the cache thanks to the durable table
+        self.client.post('/api/user_mgt/token/revoke', data={"refresh_token": rotated}, format='json')
+        revocation_store.cache.clear()
+        response = self.client.post('/api/user_mgt/token/refresh', data={"refresh_token": rotated}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_revocation_lookups_cached(self):
+        # a token found not revoked in the table isn't looked up again
+        self.assertFalse(revocation_store.is_revoked("unknown", time.time() + 60))
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation_store.is_revoked("unknown", time.time() + 60))
+        # until it's revoked
+        revocation_store.revoke({"jti": "unknown", "exp": time.time() + 60})
+        with self.assertNumQueries(0):
+            self.assertTrue(revocation_store.is_revoked("unknown"))
+
+    def test_purge_revoked_tokens(self):
+        RevokedToken.objects.create(jti="expired", expires_at=timezone.now() - timedelta(seconds=1))
+        RevokedToken.objects.create(jti="live", expires_at=timezone.now() + timedelta(days=1))
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('1 expired revoked token(s) deleted.', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ["live"])
+
     def test_user_patch(self):
         url = f'/api/user_mgt/users/{self.app_user_id}'
         response = self.client.patch(url, data={
@@ -69,3 +228,29 @@ class UserTests(AuthSetupTestCase):
         response = self.client.delete(url, format='json')
         self.assertEqual(response.status_code, 204)
 
+    def test_user_soft_delete(self):
+        user = User.objects.get(id=self.app_user_id)
+        Book.objects.create(title="Kept", author="A", publication_date="2024-01-01", isbn="0306406152", owner=user)
+        response = self.client.delete(f'/api/user_mgt/users/{user.id}', format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+        self.assertFalse(Book.objects.filter(owner_id=user.id).exists())
+        self.assertEqual(Book.all_objects.filter(owner_id=user.id).count(), 1)
+        response = self.client.get(f'/api/user_mgt/users/{user.id}')
+        self.assertEqual(response.json()['message'], "No CustomUser matches the given query.")
+        # the email stays taken until the user is purged
+        response = self.client.post('/api/user_mgt/signup', data={**self.data, "user_type": "user"}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_purge_deleted_users(self):
+        user = User.objects.get(id=self.app_user_id)
+        Book.objects.create(title="Gone", author="A", publication_date="2024-01-01", isbn="0306406152", owner=user)
+        self.client.delete(f'/api/user_mgt/users/{user.id}', format='json')
+        out = StringIO()
+        call_command('purge_deleted', '--older-than', '1', stdout=out)
+        self.assertIn('0 user(s) and 0 book(s) purged.', out.getvalue())
+        call_command('purge_deleted', '--batch-size', '1', stdout=out)
+        self.assertIn('1 user(s) and 1 book(s) purged.', out.getvalue())
+        self.assertFalse(User.all_objects.filter(id=user.id).exists())
+        self.assertFalse(Book.all_objects.filter(owner_id=user.id).exists())
+
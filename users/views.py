@@ -1,12 +1,23 @@
+import math
 from typing import List
 from django.db import transaction
-from django.shortcuts import get_object_or_404
-from django.core.paginator import Paginator
-from django.contrib.auth import get_user_model, login, logout
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.contrib.auth import alogin, get_user_model, login, logout
 from django.contrib.auth.hashers import check_password
 from .schemas import *
 from bookhiveConfig.auth import *
-from bookhiveConfig.utils import generate_user_token, refresh_access_token, CustomResponse
+from books.importer import detect_format, iter_lines, iter_rows
+from books.owners import aowner_books
+from .deletion import soft_delete_user
+from .importer import import_users
+from bookhiveConfig.utils import generate_user_token, refresh_access_token, revoke_refresh_token, CustomResponse
+from bookhiveConfig.cache import user_cache
+from bookhiveConfig.hashing import PoolSaturated, hashing_pool, verify_password
+from bookhiveConfig.pagination import apaginate_by_page, apaginate_by_cursor
+from bookhiveConfig.serialization import schema_fields, serialize_rows
+from bookhiveConfig.throttling import client_ip, login_email_throttle, login_ip_throttle
+from jobs.queue import enqueue, spool
+from jobs.views import job_accepted
 
 User = get_user_model()
 
@@ -29,13 +40,28 @@ def return_user_data(user):
     ).dict()
 
 
+def filter_users(id=None, email=None, first_name=None, last_name=None):
+    queryset = User.objects.all().order_by('id')
+    # apply filters dynamically based on the id, email, first_name, or last_name..
+    if id:
+        queryset = queryset.filter(id=id)
+    if email:
+        queryset = queryset.filter(email__icontains=email)
+    if first_name:
+        queryset = queryset.filter(first_name__icontains=first_name)
+    if last_name:
+        queryset = queryset.filter(last_name__icontains=last_name)
+    return queryset
+
+
 @api.post("/signup", response=UserResponseSchema)
 @ transaction.atomic
 def signup(request, data: UserSignupSchema):
     try:
         # check if a user with that email address already exists
         email = data.email.lower()
-        if User.objects.filter(email=email).exists():
+        # soft-deleted users keep their email until they're purged
+        if User.all_objects.filter(email=email).exists():
             return CustomResponse.failed(message="A user with this email address already exists")
 
         user = User.objects.create_user(
@@ -54,25 +80,57 @@ def signup(request, data: UserSignupSchema):
         return CustomResponse.failed(message=str(e))
 
 
+@api.post("/users/bulk", response=dict, auth=BearerAuth())
+def bulk_import_users(request, format=None, batch_size: int = None, background: bool = False):
+    # the body is streamed as CSV or NDJSON rows shaped like signup bodies,
+    # passwords are hashed in parallel and users inserted in batches
+    try:
+        # only admins and superusers can provision users
+        if request.user.user_type == 'user':
+            return CustomResponse.failed(message="You do not have the permission to import users.", status=403)
+        fmt = detect_format(format, content_type=request.content_type or "")
+        if background:
+            # the upload is only saved here, a worker hashes and imports it
+            job = enqueue(
+                "users.import",
+                {"path": spool(request, suffix=f".{fmt}"), "format": fmt, "batch_size": batch_size},
+                owner=request.user
+            )
+            return job_accepted(job, "User import queued")
+        report = import_users(iter_rows(iter_lines(request), fmt), batch_size=batch_size)
+        if report.failed and not report.created:
+            return CustomResponse.failed(data=report.as_dict(), message="No users were imported")
+        return CustomResponse.success(data=report.as_dict(), message="Users imported successfully", status=201)
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
 @api.post("/login", response=TokenResponseSchema)
-def login_user(request, data: UserLoginSchema):
-    def validate_user_credentials(data):
-        email = data.email.lower()
-        password = data.password
-        user = User.objects.filter(email=email).first()
-        if user and user.check_password(password):
-            return user
-        else:
-            raise ValueError('Invalid email or password')
+async def login_user(request, data: UserLoginSchema):
+    email = data.email.lower()
+
+    # throttle by client and by account before paying for the password hash
+    wait = max(await login_ip_throttle.aconsume(client_ip(request)), await login_email_throttle.aconsume(email))
+    if wait:
+        response = CustomResponse.failed(message="Too many login attempts, please try again later", status=429)
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
 
-    # validate user credentials
+    # validate user credentials, the hash is checked on the hashing pool
+    user = await User.objects.filter(email=email).afirst()
     try:
-        user = validate_user_credentials(data)
-    except ValueError as e:
-        return CustomResponse.failed(message=str(e))
+        valid, upgraded = await hashing_pool.arun(verify_password, data.password, user.password if user else None)
+    except PoolSaturated as e:
+        return CustomResponse.failed(message=str(e), status=503)
+    if not (user and valid):
+        return CustomResponse.failed(message='Invalid email or password')
+    if upgraded:
+        # move the user to the preferred hasher now that we know the password
+        user.password = upgraded
+        await user.asave(update_fields=["password"])
 
     # log the user in
-    login(request, user)
+    await alogin(request, user)
 
     # generate tokens for the user
     token = generate_user_token(user)
@@ -86,8 +144,9 @@ def login_user(request, data: UserLoginSchema):
     )
 
 
-@api.get("/users", response=List[UserResponseSchema], auth=BearerAuth())
-def get_all_users(request, page=1, size=10, id=None, email=None, first_name=None, last_name=None):
+@api.get("/users", response=List[UserResponseSchema], auth=AsyncBearerAuth())
+async def get_all_users(request, page=1, size=10, id=None, email=None, first_name=None, last_name=None,
+                  pagination="page", after=None, before=None, include_total: bool = True):
     try:
         # only admins and superusers can view all users..
         # a normal user only gets to see his/her own data
@@ -97,42 +156,59 @@ def get_all_users(request, page=1, size=10, id=None, email=None, first_name=None
                 data=return_user_data(request.user)
             )
 
-        queryset = User.objects.all().order_by('id')
-        # apply filters dynamically based on the id, email, first_name, or last_name
-        if id:
-            queryset = queryset.filter(id=id)
-        if email:
-            queryset = queryset.filter(email__icontains=email)
-        if first_name:
-            queryset = queryset.filter(first_name__icontains=first_name)
-        if last_name:
-            queryset = queryset.filter(last_name__icontains=last_name)
-
-        # paginate the results
-        paginator = Paginator(queryset, size)
-        paginated_users = paginator.get_page(page)
+        queryset = filter_users(id=id, email=email, first_name=first_name, last_name=last_name)
+        # only pull the columns the response needs, as plain dicts
+        queryset = queryset.values(*schema_fields(UserResponseSchema))
+
+        # paginate the results, cursor mode keeps the ascending id order
+        if pagination == "cursor" or after or before:
+            object_list, meta = await apaginate_by_cursor(
+                queryset, size, after=after, before=before,
+                include_total=include_total, descending=False
+            )
+        else:
+            object_list, meta = await apaginate_by_page(queryset, page, size, include_total=include_total)
+        if "total" in meta:
+            meta["total_users"] = meta.pop("total")
 
         # convert paginated users to a list of dicts
-        users = [return_user_data(user) for user in paginated_users.object_list]
+        users = serialize_rows(UserResponseSchema, object_list)
         return CustomResponse.success(
-            data={
-                "users": users,
-                "page": page,
-                "size": size,
-                "total_pages": paginator.num_pages,
-                "total_users": paginator.count,
-            },
+            data={"users": users, **meta},
             message="User(s) retrieved successfully"
         )
     except Exception as e: return CustomResponse.failed(message=str(e))
 
 
-@api.get("/users/{user_id}", response=UserResponseSchema, auth=BearerAuth())
-def get_user_by_id(request, user_id):
+@api.get("/users/{user_id}", response=UserResponseSchema, auth=AsyncBearerAuth())
+async def get_user_by_id(request, user_id):
     try:
-        user = get_object_or_404(User, id=user_id)
-        user_info = return_user_data(user)
-        return CustomResponse.success(data=return_user_data(user), message="User record retrieved successfully")
+        # serve the serialized user from the cache, it's rebuilt on a miss
+        # and dropped whenever the user is saved or deleted
+        user_id = int(user_id)
+
+        async def load():
+            return return_user_data(await aget_object_or_404(User, id=user_id))
+
+        data = await user_cache.aget_or_load(user_id, load)
+        return CustomResponse.success(data=data, message="User record retrieved successfully")
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))
+
+
+@api.get("/users/{user_id}/books", response=dict, auth=AsyncBearerAuth())
+async def get_user_books(request, user_id, page=1, size=10, pagination="cursor", after=None, before=None,
+                         include_total: bool = True):
+    try:
+        # only admins and superusers can browse another user's books
+        if request.user.user_type == 'user':
+            return CustomResponse.failed(message="You do not have the permission to view this resource.", status=403)
+        user = await aget_object_or_404(User.objects.only('id'), id=int(user_id))
+        data = await aowner_books(
+            user.books.all(), user.id, page=page, size=size, pagination=pagination,
+            after=after, before=before, include_total=include_total
+        )
+        return CustomResponse.success(data=data, message="Books retrieved successfully")
     except Exception as e:
         return CustomResponse.failed(message=str(e))
 
@@ -170,7 +246,9 @@ def put_user(request, user_id, data: UserUpdateSchema):
 def delete_user(request, user_id):
     try:
         user = get_object_or_404(User, id=user_id)
-        user.delete()
+        # hides the user and their books right away, without loading them,
+        # purge_deleted removes the rows later in batches
+        soft_delete_user(user)
         return CustomResponse.success(message="User deleted successfully", status=204)
     except Exception as e:
         return CustomResponse.failed(message=str(e))
@@ -186,3 +264,12 @@ def refresh_token(request, data: TokenRefreshSchema):
     except Exception as e:
         return CustomResponse.failed(message=str(e))
 
+
+@api.post("/token/revoke", response=dict)
+def revoke_token(request, data: TokenRefreshSchema):
+    # revokes the provided refresh token, e.g. when the user logs out
+    try:
+        revoke_refresh_token(data.refresh_token)
+        return CustomResponse.success(message="Token revoked successfully")
+    except Exception as e:
+        return CustomResponse.failed(message=str(e))